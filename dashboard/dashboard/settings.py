@@ -37,13 +37,57 @@ CORS_ALLOWED_ORIGINS = [
     'http://127.0.0.1:8000',
 ]
 
+# Local state files (cache, search index). Must only be writable by the
+# service account: cached values are unpickled when read.
+DASHBOARD_DATA_DIR = Path(os.environ.get('DASHBOARD_DATA_DIR', BASE_DIR / 'var'))
+
+# Shared by all worker processes on this host through a local SQLite file
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        'BACKEND': 'dashboard_app.cache_backends.SQLiteCache',
+        'LOCATION': os.environ.get('DASHBOARD_CACHE_PATH', str(DASHBOARD_DATA_DIR / 'cache.sqlite3')),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'CULL_FREQUENCY': 3,
+        },
     }
 }
 
+# Number of Matomo actions kept in each worker's in-process action dictionary
+MATOMO_ACTION_CACHE_SIZE = 50000
+
+# Number of decoded PHP-serialized usermeta values kept in each worker
+USERMETA_DECODE_CACHE_SIZE = 10000
+
+# Maximum age in seconds of a cached analytics result, even if its data watermark is unchanged
+ANALYTICS_CACHE_TIMEOUT = 60 * 60
+
+# How long an outdated analytics result may still be served while it is refreshed in the background
+ANALYTICS_STALE_TIMEOUT = 24 * 60 * 60
+
+# Seconds a probe of an unindexed watermark column (post edits) is shared between requests
+ANALYTICS_SLOW_PROBE_TTL = 30
+
+# Widgets of one dashboard bundle request computed in parallel
+ANALYTICS_BUNDLE_WORKERS = 4
+
+# Worker processes tokenizing large note batches (0 counts in the web/command process)
+NOTES_TEXT_WORKERS = 0
+
+# Local SQLite FTS5 index behind the notes search endpoint
+NOTES_SEARCH_INDEX = os.environ.get(
+    'DASHBOARD_NOTES_SEARCH_PATH', str(DASHBOARD_DATA_DIR / 'notes_search.sqlite3')
+)
+
+# Words left out of the notes word clouds (compared after lower-casing)
+NOTES_STOP_WORDS = [
+    'about', 'also', 'because', 'been', 'could', 'does', 'from', 'have', 'into',
+    'just', 'like', 'more', 'much', 'only', 'other', 'should', 'some', 'than',
+    'that', 'their', 'them', 'then', 'there', 'these', 'they', 'this', 'those',
+    'very', 'were', 'what', 'when', 'where', 'which', 'will', 'with', 'would', 'your',
+]
+
 
 PASSWORD_RESET_TIMEOUT = 3600 
 
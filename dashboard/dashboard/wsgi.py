@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dashboard.settings')
 
 application = get_wsgi_application()
+
+# Preload Matomo action names before the worker starts serving requests
+from dashboard_app.action_cache import warm_action_dictionary  # noqa: E402
+
+warm_action_dictionary()
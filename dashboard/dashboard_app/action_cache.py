@@ -0,0 +1,91 @@
+"""
+Process-wide dictionary of Matomo actions.
+
+Maps `idaction` to the action name, type and cleaned path so views do not
+look actions up row by row or re-parse the same URLs on every request.
+Misses are filled with batched `idaction__in` queries.
+"""
+import logging
+from collections import namedtuple
+from urllib.parse import urlparse
+
+from django.conf import settings
+
+from .lru import LRUCache
+from .models import MatomoLogAction
+
+logger = logging.getLogger('django')
+
+# Maximum number of IDs sent in a single `idaction__in` lookup
+ACTION_LOOKUP_BATCH_SIZE = 1000
+
+ActionEntry = namedtuple('ActionEntry', ['name', 'type', 'path'])
+
+
+def clean_path(url):
+    """
+    去除域名，仅保留路径部分
+    """
+    if not url:
+        return url
+    if url.startswith("http"):
+        return urlparse(url).path or '/'
+    if '/' in url:
+        return '/' + url.split('/', 1)[1]
+    return url
+
+
+class ActionDictionary:
+    """Bounded LRU of `idaction` -> ActionEntry backed by bl_matomo_log_action"""
+
+    def __init__(self, max_size):
+        self._entries = LRUCache(max_size)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _load(self, queryset):
+        loaded = {
+            idaction: ActionEntry(name, action_type, clean_path(name))
+            for idaction, name, action_type in queryset.values_list('idaction', 'name', 'type')
+        }
+        self._entries.set_many(loaded)
+        return loaded
+
+    def get_many(self, action_ids):
+        """
+        Return `{idaction: ActionEntry}` for the given IDs. IDs that do not
+        exist in the action table are left out.
+        """
+        action_ids = {action_id for action_id in action_ids if action_id is not None}
+        entries = self._entries.get_many(action_ids)
+
+        missing = list(action_ids - entries.keys())
+        for i in range(0, len(missing), ACTION_LOOKUP_BATCH_SIZE):
+            batch = missing[i:i + ACTION_LOOKUP_BATCH_SIZE]
+            entries.update(self._load(MatomoLogAction.objects.filter(idaction__in=batch)))
+        return entries
+
+    def names(self, action_ids):
+        """Return `{idaction: name}` for the given IDs."""
+        return {action_id: entry.name for action_id, entry in self.get_many(action_ids).items()}
+
+    def warm(self):
+        """Preload the most recently created actions, up to the cache size."""
+        recent = MatomoLogAction.objects.order_by('-idaction')[:self._entries.max_size]
+        return len(self._load(recent))
+
+    def clear(self):
+        self._entries.clear()
+
+
+action_dictionary = ActionDictionary(getattr(settings, 'MATOMO_ACTION_CACHE_SIZE', 50000))
+
+
+def warm_action_dictionary():
+    """Fill the action dictionary at worker start without blocking startup on errors."""
+    try:
+        count = action_dictionary.warm()
+        logger.info(f"Action dictionary warmed with {count} actions")
+    except Exception as e:
+        logger.warning(f"Could not warm action dictionary: {e}")
@@ -0,0 +1,180 @@
+"""
+Category index over bl_matomo_log_action.
+
+Each action gets a bitmask of the content categories its name mentions,
+stored locally in ActionCategory. Views filter on the integer mask instead
+of running `name LIKE '%...%'` scans over the whole action table. Matomo
+only ever appends actions, so the index is extended by `idaction` watermark
+from the `refresh_action_categories` command; reads never write to it.
+Until the index has been built once, actions are classified live.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import ActionCategory, AnalyticsWatermark, MatomoLogAction
+
+NOTE = 1 << 0
+COMMENT = 1 << 1
+FORUM = 1 << 2
+COURSE = 1 << 3
+LESSON = 1 << 4
+MODULE = 1 << 5
+BOOKMARK = 1 << 6
+SETTING = 1 << 7
+PAGE = 1 << 8
+COURSE_PATH = 1 << 9
+
+# Substring searched in the lower-cased action name for each flag. COURSE
+# matches 'course' anywhere, as the learning heatmap and interaction types
+# always did; course_source_analysis only follows URLs with a '/course' path.
+CATEGORY_KEYWORDS = (
+    (NOTE, 'note'),
+    (COMMENT, 'comment'),
+    (FORUM, 'forum'),
+    (COURSE, 'course'),
+    (COURSE_PATH, '/course'),
+    (LESSON, 'lesson'),
+    (MODULE, 'module'),
+    (BOOKMARK, 'bookmark'),
+    (SETTING, 'setting'),
+    (PAGE, 'page'),
+)
+
+# Interaction type reported by user_content_interaction, in priority order
+INTERACTION_TYPES = (
+    (COURSE, 'course_view'),
+    (NOTE, 'note_view'),
+    (COMMENT, 'comment_view'),
+    (BOOKMARK, 'bookmark_view'),
+    (SETTING, 'setting_view'),
+    (PAGE, 'page_view'),
+)
+
+CATEGORY_WATERMARK = 'action_categories'
+
+# Actions classified per refresh step
+CATEGORY_REFRESH_BATCH_SIZE = 10000
+
+# Largest `idaction__in` list sent to the remote Matomo tables at once
+ACTION_ID_CHUNK_SIZE = 1000
+
+
+def classify(name):
+    """Return the category bitmask for an action name."""
+    name = (name or '').lower()
+    mask = 0
+    for flag, keyword in CATEGORY_KEYWORDS:
+        if keyword in name:
+            mask |= flag
+    return mask
+
+
+def interaction_type(mask):
+    """Map a category bitmask to its user_content_interaction type."""
+    for flag, label in INTERACTION_TYPES:
+        if mask & flag:
+            return label
+    return 'content_view'
+
+
+def refresh_action_categories(batch_size=CATEGORY_REFRESH_BATCH_SIZE):
+    """
+    Classify actions created since the last refresh.
+
+    Returns the number of actions added to the index.
+    """
+    processed = 0
+    while True:
+        watermark, _ = AnalyticsWatermark.objects.get_or_create(name=CATEGORY_WATERMARK)
+        actions = list(
+            MatomoLogAction.objects
+            .filter(idaction__gt=watermark.value)
+            .order_by('idaction')
+            .values_list('idaction', 'name')[:batch_size]
+        )
+        if not actions:
+            return processed
+
+        with transaction.atomic():
+            ActionCategory.objects.bulk_create(
+                [ActionCategory(idaction=idaction, categories=classify(name)) for idaction, name in actions],
+                ignore_conflicts=True
+            )
+            watermark.value = actions[-1][0]
+            watermark.save()
+
+        processed += len(actions)
+
+
+def categories_available():
+    """Whether the index has been built at least once."""
+    return AnalyticsWatermark.objects.filter(name=CATEGORY_WATERMARK, value__gt=0).exists()
+
+
+def _live_actions(mask):
+    """Remote actions whose name mentions any keyword of the flags in `mask`."""
+    keywords = [keyword for flag, keyword in CATEGORY_KEYWORDS if flag & mask]
+    if not keywords:
+        return MatomoLogAction.objects.none()
+    return MatomoLogAction.objects.filter(
+        reduce(or_, (Q(name__icontains=keyword) for keyword in keywords))
+    )
+
+
+def category_action_ids(mask):
+    """
+    IDs of actions matching any of the flags in `mask`.
+
+    From the index this is a lazy `idaction` queryset on the local
+    database: only the bitmask values present that intersect `mask` are
+    listed, so the lookup is an indexed `categories IN (...)`. Use it as a
+    subquery on local tables, or `category_action_id_chunks` for the remote
+    Matomo tables. Before the index is built the IDs are read from the
+    action table with `LIKE` scans and returned as a list.
+    """
+    if not categories_available():
+        return list(_live_actions(mask).values_list('idaction', flat=True))
+    present = ActionCategory.objects.values_list('categories', flat=True).distinct().order_by()
+    masks = [value for value in present if value & mask]
+    return ActionCategory.objects.filter(categories__in=masks).values_list('idaction', flat=True)
+
+
+def category_action_id_chunks(mask, size=ACTION_ID_CHUNK_SIZE):
+    """Yield the IDs of `category_action_ids(mask)` in lists of at most `size`."""
+    action_ids = category_action_ids(mask)
+    if isinstance(action_ids, list):
+        for start in range(0, len(action_ids), size):
+            yield action_ids[start:start + size]
+        return
+
+    chunk = []
+    for idaction in action_ids.order_by('idaction').iterator(chunk_size=size):
+        chunk.append(idaction)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def category_masks(action_ids):
+    """
+    Return `{idaction: bitmask}` for the given action IDs, classifying the
+    action names live until the index has been built.
+    """
+    action_ids = list(action_ids)
+    if categories_available():
+        return dict(
+            ActionCategory.objects.filter(idaction__in=action_ids).values_list('idaction', 'categories')
+        )
+
+    masks = {}
+    for start in range(0, len(action_ids), ACTION_ID_CHUNK_SIZE):
+        names = MatomoLogAction.objects.filter(
+            idaction__in=action_ids[start:start + ACTION_ID_CHUNK_SIZE]
+        ).values_list('idaction', 'name')
+        masks.update((idaction, classify(name)) for idaction, name in names)
+    return masks
@@ -0,0 +1,124 @@
+"""
+Database-side aggregations shared by the Matomo analytics endpoints.
+"""
+from django.db.models import Count, DateField, DateTimeField, Func, PositiveBigIntegerField, Q
+from django.db.models.functions import Cast, ExtractHour, ExtractWeekDay, Trunc, TruncDate
+from django.utils import timezone
+
+
+class FromUnixTime(Func):
+    """
+    Convert a Unix timestamp in seconds to a UTC datetime, so it can be
+    truncated like any other DateTimeField.
+    """
+    function = 'FROM_UNIXTIME'
+    output_field = DateTimeField()
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        # FROM_UNIXTIME answers in the session time zone
+        return self.as_sql(
+            compiler, connection,
+            template="CONVERT_TZ(FROM_UNIXTIME(%(expressions)s), @@session.time_zone, '+00:00')",
+            **extra_context
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template="datetime(%(expressions)s, 'unixepoch')", **extra_context
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='TO_TIMESTAMP', **extra_context)
+
+
+def unix_timestamp(field):
+    """Numeric value of a text column holding a Unix timestamp (e.g. usermeta)."""
+    return Cast(field, PositiveBigIntegerField())
+
+
+def period_trunc(expression, interval):
+    """Truncate a datetime to the date starting its day/week/month/year."""
+    # 先取日期再截断：MySQL 对 DATETIME 按周截断时会保留时分秒
+    return Trunc(TruncDate(expression), interval, output_field=DateField())
+
+
+class TimeZoneConversionError(ValueError):
+    """The database could not convert datetimes to the requested time zone."""
+
+
+def weekly_heatmap(queryset, field='server_time', start_date=None, end_date=None, tzinfo=None):
+    """
+    Count rows per weekday and hour of `field` in a single GROUP BY query.
+
+    `start_date`/`end_date` limit the inclusive date range and `tzinfo`
+    selects the time zone used for both the range and the buckets (the
+    current time zone by default). Returns the 168 heatmap cells as
+    `{'day', 'hour', 'count'}` with day 0 = Sunday.
+
+    MySQL's CONVERT_TZ yields NULL for zones missing from the server's time
+    zone tables; such rows raise TimeZoneConversionError instead of being
+    dropped silently.
+    """
+    with timezone.override(tzinfo or timezone.get_current_timezone()):
+        if start_date:
+            queryset = queryset.filter(**{f'{field}__date__gte': start_date})
+        if end_date:
+            queryset = queryset.filter(**{f'{field}__date__lte': end_date})
+
+        rows = (
+            queryset
+            .annotate(weekday=ExtractWeekDay(field), hour=ExtractHour(field))
+            .values('weekday', 'hour')
+            .annotate(count=Count('pk'))
+            .order_by()
+        )
+
+        heatmap_data = [
+            {'day': day, 'hour': hour, 'count': 0}
+            for day in range(7)  # 0=Sunday, 6=Saturday
+            for hour in range(24)
+        ]
+        for row in rows:
+            if row['weekday'] is None or row['hour'] is None:
+                raise TimeZoneConversionError(
+                    f"The database cannot convert times to {timezone.get_current_timezone_name()}"
+                )
+            # ExtractWeekDay numbers days 1=Sunday .. 7=Saturday
+            heatmap_data[(row['weekday'] - 1) * 24 + row['hour']]['count'] = row['count']
+
+    return heatmap_data
+
+
+def combined_weekly_heatmap(querysets, **kwargs):
+    """
+    Sum of `weekly_heatmap` over several querysets, e.g. the chunks of a
+    long `__in` list. Takes the same keyword arguments.
+    """
+    heatmap_data = [
+        {'day': day, 'hour': hour, 'count': 0}
+        for day in range(7)
+        for hour in range(24)
+    ]
+    for queryset in querysets:
+        for total, cell in zip(heatmap_data, weekly_heatmap(queryset, **kwargs)):
+            total['count'] += cell['count']
+    return heatmap_data
+
+
+def bucketed_histogram(queryset, field, edges):
+    """
+    Count rows of `queryset` per bucket of the numeric `field` in one query.
+
+    `edges` are the ascending lower bounds of the buckets: bucket i covers
+    `edges[i] <= value < edges[i + 1]` and the last bucket is open-ended.
+    Values below `edges[0]` are not counted. Returns one count per edge.
+    """
+    aggregates = {}
+    for i, lower in enumerate(edges):
+        condition = Q(**{f'{field}__gte': lower})
+        if i + 1 < len(edges):
+            condition &= Q(**{f'{field}__lt': edges[i + 1]})
+        aggregates[f'bucket_{i}'] = Count(field, filter=condition)
+
+    counts = queryset.aggregate(**aggregates)
+    return [counts[f'bucket_{i}'] for i in range(len(edges))]
@@ -0,0 +1,244 @@
+"""
+Result cache for the read-only analytics endpoints.
+
+Each cached payload is stored together with the data watermark it was
+computed at (e.g. `MAX(idlink_va)`). A request first probes the current
+watermark, a MAX() over an indexed key, and only recomputes the endpoint
+when the underlying data has moved on or the entry has expired. Columns
+without an index (post edits) are probed at most every few seconds.
+Slow endpoints can opt into stale-while-revalidate refreshes.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Max
+from django.test import RequestFactory
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .action_categories import CATEGORY_WATERMARK
+from .models import (
+    AnalyticsWatermark, MatomoLogLinkVisitAction, MatomoLogVisit, WPComments, WPPost, WPUserMeta
+)
+from .text_index import NOTE_INDEX_WATERMARK
+from .transitions import TRANSITION_WATERMARK
+from .visit_rollup import ROLLUP_WATERMARK
+
+logger = logging.getLogger('django')
+
+# Watermark name -> (model, column whose maximum changes when data is added)
+WATERMARKS = {
+    'link_visit_action': (MatomoLogLinkVisitAction, 'idlink_va'),
+    'visit': (MatomoLogVisit, 'idvisit'),
+    'posts': (WPPost, 'ID'),
+    'usermeta': (WPUserMeta, 'umeta_id'),
+    'comments': (WPComments, 'comment_ID'),
+}
+
+# Watermark name -> (model, unindexed column) probed in addition to the
+# indexed one; its MAX() scans the table, so the value is shared through the
+# cache for ANALYTICS_SLOW_PROBE_TTL seconds
+SLOW_WATERMARKS = {
+    'posts': (WPPost, 'post_modified'),
+}
+
+ANALYTICS_SLOW_PROBE_TTL = getattr(settings, 'ANALYTICS_SLOW_PROBE_TTL', 30)
+
+# Watermark name -> AnalyticsWatermark row advanced by the refresh command
+# of a local index, so results are recomputed once the index is refreshed
+LOCAL_WATERMARKS = {
+    'action_categories': CATEGORY_WATERMARK,
+    'note_index': NOTE_INDEX_WATERMARK,
+    'page_transitions': TRANSITION_WATERMARK,
+    'visit_rollup': ROLLUP_WATERMARK,
+}
+
+# Upper bound on the age of a cached result even if no watermark moved
+ANALYTICS_CACHE_TIMEOUT = getattr(settings, 'ANALYTICS_CACHE_TIMEOUT', 60 * 60)
+
+# How long an outdated result may still be served while it is recomputed
+ANALYTICS_STALE_TIMEOUT = getattr(settings, 'ANALYTICS_STALE_TIMEOUT', 24 * 60 * 60)
+
+# Upper bound on a background refresh before another worker may retry it
+ANALYTICS_REFRESH_LOCK_TIMEOUT = 10 * 60
+
+AnalyticsEndpoint = namedtuple(
+    'AnalyticsEndpoint', ['name', 'view', 'sources', 'params', 'timeout', 'stale_while_revalidate']
+)
+
+# View function name -> AnalyticsEndpoint of every cached analytics view
+ANALYTICS_ENDPOINTS = {}
+
+
+def probe_watermark(sources):
+    """
+    Return the current watermark values for the given source names. Local
+    index watermarks are read together in one query.
+    """
+    local_names = [LOCAL_WATERMARKS[source] for source in sources if source in LOCAL_WATERMARKS]
+    local = dict(
+        AnalyticsWatermark.objects.filter(name__in=local_names).values_list('name', 'value')
+    ) if local_names else {}
+
+    values = []
+    for source in sources:
+        if source in LOCAL_WATERMARKS:
+            values.append(local.get(LOCAL_WATERMARKS[source]))
+            continue
+        model, column = WATERMARKS[source]
+        value = model.objects.aggregate(value=Max(column))['value']
+        if source in SLOW_WATERMARKS:
+            value = (value, _slow_probe(source))
+        values.append(value)
+    return tuple(values)
+
+
+def _slow_probe(source):
+    key = f"analytics:probe:{source}"
+    value = cache.get(key)
+    if value is None:
+        model, column = SLOW_WATERMARKS[source]
+        value = model.objects.aggregate(value=Max(column))['value']
+        cache.set(key, value, ANALYTICS_SLOW_PROBE_TTL)
+    return value
+
+
+def cache_key(endpoint, query_params, params=()):
+    """
+    Build the cache key from the endpoint and its normalized query
+    parameters. Only the parameters listed in `params` are considered, so
+    unrelated ones (e.g. cache busters) do not split the cache.
+    """
+    names = sorted(params)
+    normalized = [
+        (name, sorted(value.strip() for value in query_params.getlist(name)))
+        for name in names
+        if query_params.getlist(name)
+    ]
+    digest = hashlib.md5(json.dumps(normalized).encode('utf-8')).hexdigest()
+    return f"analytics:{endpoint}:{digest}"
+
+
+def _store(key, current, response, timeout):
+    """Cache a successful response. Entries outlive `timeout` by the stale window."""
+    if isinstance(response, Response) and response.status_code == 200:
+        entry = {'watermark': current, 'data': response.data, 'computed_at': time.time()}
+        cache.set(key, entry, timeout + ANALYTICS_STALE_TIMEOUT)
+
+
+def _cached_response(entry, stale=False):
+    response = Response(entry['data'])
+    response['Age'] = str(int(time.time() - entry['computed_at']))
+    if stale:
+        response['Warning'] = '110 - "Response is Stale"'
+    return response
+
+
+def _refresh_in_background(endpoint, key, current, timeout, view_func, request, args, kwargs):
+    """
+    Recompute an entry on a background thread. The lock is taken in the
+    shared cache, so only one thread across all workers refreshes a key.
+    """
+    lock_key = f"{key}:refresh"
+    if not cache.add(lock_key, True, ANALYTICS_REFRESH_LOCK_TIMEOUT):
+        return
+
+    def refresh():
+        try:
+            _store(key, current, view_func(request, *args, **kwargs), timeout)
+        except Exception as e:
+            logger.error(f"Background refresh failed for {endpoint}: {e}", exc_info=True)
+        finally:
+            cache.delete(lock_key)
+            connections.close_all()
+
+    threading.Thread(target=refresh, name=f"refresh-{endpoint}", daemon=True).start()
+
+
+def cached_analytics(watermark, params=(), timeout=ANALYTICS_CACHE_TIMEOUT, stale_while_revalidate=False):
+    """
+    Cache successful responses of a read-only analytics view.
+
+    `watermark` names one or more entries of WATERMARKS or LOCAL_WATERMARKS;
+    a cached result is fresh while all of them are unchanged and it is
+    younger than `timeout`.
+    `params` lists the query parameters the view depends on.
+
+    With `stale_while_revalidate`, a request that finds an outdated entry
+    gets the last good payload at once (with `Age` and `Warning: 110`
+    headers) while one background thread recomputes it. Apply below
+    `@api_view`.
+    """
+    sources = (watermark,) if isinstance(watermark, str) else tuple(watermark)
+
+    def decorator(view_func):
+        endpoint = AnalyticsEndpoint(
+            view_func.__name__, view_func, sources, tuple(params), timeout, stale_while_revalidate
+        )
+        ANALYTICS_ENDPOINTS[endpoint.name] = endpoint
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            return _serve(endpoint, request, args, kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _serve(endpoint, request, args, kwargs, revalidate_in_background=True):
+    key = cache_key(endpoint.name, request.query_params, endpoint.params)
+    try:
+        current = probe_watermark(endpoint.sources)
+    except Exception as e:
+        logger.warning(f"Watermark probe failed for {endpoint.name}: {e}")
+        return endpoint.view(request, *args, **kwargs)
+
+    entry = cache.get(key)
+    if entry is not None:
+        if entry['watermark'] == current and time.time() - entry['computed_at'] < endpoint.timeout:
+            return _cached_response(entry)
+        if endpoint.stale_while_revalidate and revalidate_in_background:
+            _refresh_in_background(
+                endpoint.name, key, current, endpoint.timeout, endpoint.view, request, args, kwargs
+            )
+            return _cached_response(entry, stale=True)
+
+    response = endpoint.view(request, *args, **kwargs)
+    _store(key, current, response, endpoint.timeout)
+    return response
+
+
+def analytics_routes():
+    """(route, view name) of every cached analytics view in dashboard_app/urls.py."""
+    from . import urls
+
+    routes = []
+    for pattern in urls.urlpatterns:
+        view_class = getattr(pattern.callback, 'cls', None)
+        if view_class is not None and view_class.__name__ in ANALYTICS_ENDPOINTS:
+            routes.append((str(pattern.pattern), view_class.__name__))
+    return routes
+
+
+def call_endpoint(name, query=None, user=None, revalidate_in_background=False):
+    """
+    Serve a cached analytics endpoint outside of its own client request,
+    e.g. to warm the cache or inside a bundle. Outdated entries are
+    recomputed before returning unless `revalidate_in_background` lets a
+    stale-while-revalidate endpoint answer from the stale entry.
+    Authentication and throttling are not applied.
+    """
+    endpoint = ANALYTICS_ENDPOINTS[name]
+    request = Request(RequestFactory().get('/', query or {}))
+    if user is not None:
+        request.user = user
+    return _serve(endpoint, request, (), {}, revalidate_in_background=revalidate_in_background)
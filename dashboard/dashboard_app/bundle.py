@@ -0,0 +1,66 @@
+"""
+Composite dashboard requests.
+
+A bundle names several cached analytics widgets together with their query
+parameters. The widgets are computed concurrently on a bounded thread pool,
+each thread using its own database connections, so a page load costs about
+as much as its slowest widget instead of the sum of all of them.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+from .analytics_cache import ANALYTICS_ENDPOINTS, analytics_routes, call_endpoint
+
+logger = logging.getLogger('django')
+
+# Widgets computed in parallel for one bundle request
+ANALYTICS_BUNDLE_WORKERS = getattr(settings, 'ANALYTICS_BUNDLE_WORKERS', 4)
+
+# Upper bound on the widgets a single bundle may request
+ANALYTICS_BUNDLE_MAX_WIDGETS = 30
+
+
+def resolve_widget(name):
+    """
+    Map a widget name to a cached analytics view name. Widgets are named by
+    their route (`analytics/visit-trends/`, with or without slashes) or by
+    the view function name. Returns None for unknown widgets.
+    """
+    if name in ANALYTICS_ENDPOINTS:
+        return name
+    name = name.strip('/')
+    for route, view_name in analytics_routes():
+        if route.strip('/') == name:
+            return view_name
+    return None
+
+
+def _compute_widget(view_name, params, user):
+    started = time.monotonic()
+    try:
+        response = call_endpoint(view_name, params, user, revalidate_in_background=True)
+        result = {'status': response.status_code, 'data': response.data}
+    except Exception as e:
+        logger.error(f"Bundle widget {view_name} failed: {e}", exc_info=True)
+        result = {'status': 500, 'data': {'error': str(e)}}
+    finally:
+        connections.close_all()
+    result['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+    return result
+
+
+def compute_bundle(widgets, user=None, max_workers=ANALYTICS_BUNDLE_WORKERS):
+    """
+    Compute `widgets`, a list of `(key, view name, params)` tuples, and
+    return `{key: {'status', 'data', 'elapsed_ms'}}`.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bundle') as executor:
+        futures = {
+            key: executor.submit(_compute_widget, view_name, params, user)
+            for key, view_name, params in widgets
+        }
+        return {key: future.result() for key, future in futures.items()}
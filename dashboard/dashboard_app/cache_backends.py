@@ -0,0 +1,206 @@
+"""
+SQLite-backed Django cache shared by every worker process on a node.
+
+Unlike LocMemCache, all gunicorn workers read and write the same local file,
+so cached analytics and DRF throttle counters are not duplicated per worker
+and no external cache service is needed. WAL mode lets readers proceed while
+another worker writes.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'dashboard_app.cache_backends.SQLiteCache',
+            'LOCATION': BASE_DIR / 'var' / 'cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 10000, 'CULL_FREQUENCY': 3},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import stat
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entry (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_entry_expires ON cache_entry (expires);
+CREATE INDEX IF NOT EXISTS cache_entry_accessed ON cache_entry (accessed);
+"""
+
+# Seconds between updates of an entry's last access time
+ACCESS_UPDATE_INTERVAL = 60
+
+
+def connect_private_sqlite(path):
+    """
+    Open a SQLite file that only this service account may write.
+
+    Cached values are unpickled on read, so a file another local user can
+    create or modify would let them run code in the web process. Missing
+    directories are created with mode 0700 and the file with 0600; an
+    existing file owned by another user, or writable by group or others,
+    is refused.
+    """
+    path = os.fspath(path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+    handle = os.open(path, os.O_CREAT | os.O_RDWR | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+    try:
+        info = os.fstat(handle)
+    finally:
+        os.close(handle)
+    if info.st_uid != os.getuid() or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise ImproperlyConfigured(
+            f"{path} must be owned by this user and not writable by group or others"
+        )
+    return sqlite3.connect(path, timeout=10, isolation_level=None)
+
+
+class SQLiteCache(BaseCache):
+    """
+    Cache backend storing pickled values in a local SQLite file.
+
+    When more than MAX_ENTRIES keys are stored, expired entries are removed
+    first and then 1/CULL_FREQUENCY of the least recently read entries.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = connect_private_sqlite(self._path)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def _expiry(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        return None if timeout is None else time.time() + timeout
+
+    def _fetch(self, key, now):
+        row = self._fetch_row(key, now)
+        return None if row is None else row[0]
+
+    def _fetch_row(self, key, now):
+        return self._connection.execute(
+            'SELECT value, accessed FROM cache_entry WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, now),
+        ).fetchone()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if self._fetch(key, now) is not None:
+                connection.execute('COMMIT')
+                return False
+            self._write(key, value, timeout, now)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        self._maybe_cull()
+        return True
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        row = self._fetch_row(key, now)
+        if row is None:
+            return default
+        value, accessed = row
+        # Recency only drives eviction, so avoid a write on every read
+        if now - accessed > ACCESS_UPDATE_INTERVAL:
+            self._connection.execute('UPDATE cache_entry SET accessed = ? WHERE key = ?', (now, key))
+        return pickle.loads(value)
+
+    def _write(self, key, value, timeout, now):
+        self._connection.execute(
+            'INSERT OR REPLACE INTO cache_entry (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+            (key, pickle.dumps(value, self.pickle_protocol), self._expiry(timeout), now),
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._write(key, value, timeout, time.time())
+        self._maybe_cull()
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection.execute(
+            'UPDATE cache_entry SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self._expiry(timeout), key, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection.execute('DELETE FROM cache_entry WHERE key = ?', (key,))
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._fetch(key, time.time()) is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            value = self._fetch(key, now)
+            if value is None:
+                raise ValueError(f"Key '{key}' not found")
+            new_value = pickle.loads(value) + delta
+            connection.execute(
+                'UPDATE cache_entry SET value = ?, accessed = ? WHERE key = ?',
+                (pickle.dumps(new_value, self.pickle_protocol), now, key),
+            )
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return new_value
+
+    def clear(self):
+        self._connection.execute('DELETE FROM cache_entry')
+
+    def _maybe_cull(self):
+        count = self._connection.execute('SELECT COUNT(*) FROM cache_entry').fetchone()[0]
+        if count <= self._max_entries:
+            return
+
+        connection = self._connection
+        connection.execute(
+            'DELETE FROM cache_entry WHERE expires IS NOT NULL AND expires <= ?', (time.time(),)
+        )
+        count = connection.execute('SELECT COUNT(*) FROM cache_entry').fetchone()[0]
+        if count <= self._max_entries:
+            return
+
+        if self._cull_frequency == 0:
+            self.clear()
+            return
+        connection.execute(
+            'DELETE FROM cache_entry WHERE key IN '
+            '(SELECT key FROM cache_entry ORDER BY accessed LIMIT ?)',
+            (count // self._cull_frequency,),
+        )
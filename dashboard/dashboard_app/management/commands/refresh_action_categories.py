@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dashboard_app.action_categories import CATEGORY_REFRESH_BATCH_SIZE, refresh_action_categories
+
+
+class Command(BaseCommand):
+    help = "Classify new Matomo actions into the local action category index"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=CATEGORY_REFRESH_BATCH_SIZE,
+            help='Number of actions classified per transaction',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        processed = refresh_action_categories(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Classified {processed} actions in {elapsed:.1f}s"
+        ))
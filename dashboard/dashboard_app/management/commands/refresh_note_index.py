@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dashboard_app.text_index import NOTE_INDEX_BATCH_SIZE, refresh_note_index
+
+
+class Command(BaseCommand):
+    help = "Re-tokenize new or modified notes into the local term-frequency index"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=NOTE_INDEX_BATCH_SIZE,
+            help='Number of notes re-tokenized per transaction',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        indexed, removed = refresh_note_index(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {indexed} notes and removed {removed} in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dashboard_app.notes_search import NOTES_SEARCH_BATCH_SIZE, refresh_notes_search
+
+
+class Command(BaseCommand):
+    help = "Re-index new or modified notes into the local full-text search index"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=NOTES_SEARCH_BATCH_SIZE,
+            help='Number of notes re-indexed per transaction',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        indexed, removed = refresh_notes_search(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {indexed} notes and removed {removed} in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dashboard_app.transitions import TRANSITION_REFRESH_BATCH_SIZE, refresh_page_transitions
+
+
+class Command(BaseCommand):
+    help = "Fold new Matomo action log rows into the stored page transition matrix"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=TRANSITION_REFRESH_BATCH_SIZE,
+            help='Number of log rows processed per transaction',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        processed = refresh_page_transitions(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {processed} action log rows in {elapsed:.1f}s"
+        ))
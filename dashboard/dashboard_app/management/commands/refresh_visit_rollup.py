@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dashboard_app.visit_rollup import refresh_visit_rollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily visit rollup for days that received new Matomo visits"
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        days = refresh_visit_rollup()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(days)} days of visit rollup in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,116 @@
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from dashboard_app.action_categories import refresh_action_categories
+from dashboard_app.analytics_cache import ANALYTICS_ENDPOINTS, analytics_routes, call_endpoint
+
+# Date ranges the dashboard offers, in days back from today
+PRESET_DAYS = (7, 30, 90)
+
+INTERVALS = ('day', 'week', 'month')
+
+# Endpoints that reject requests without a user ID; views where the user is
+# an optional filter still have presets worth warming
+USER_REQUIRED_ENDPOINTS = ('user_content_interaction',)
+
+
+def warm_routes():
+    """Cached analytics routes that have presets worth warming."""
+    return [
+        (route, name) for route, name in analytics_routes()
+        if name not in USER_REQUIRED_ENDPOINTS
+    ]
+
+
+def presets(params):
+    """Query parameter sets to warm for an endpoint declaring `params`."""
+    today = timezone.localdate()
+    ranges = [{}]
+    if 'start_date' in params:
+        for days in PRESET_DAYS:
+            preset = {'start_date': (today - timedelta(days=days)).isoformat()}
+            if 'end_date' in params:
+                preset['end_date'] = today.isoformat()
+            ranges.append(preset)
+
+    intervals = [{}]
+    if 'interval' in params:
+        intervals = [{'interval': interval} for interval in INTERVALS]
+
+    return [dict(date_range, **interval) for date_range in ranges for interval in intervals]
+
+
+def warm(name, query):
+    started = time.monotonic()
+    try:
+        response = call_endpoint(name, query)
+        return response.status_code, time.monotonic() - started
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Compute the cached analytics endpoints for the common dashboard presets"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help="Endpoints computed in parallel",
+        )
+        parser.add_argument(
+            'endpoints',
+            nargs='*',
+            help="Only warm these routes or view names",
+        )
+
+    def handle(self, *args, **options):
+        routes = warm_routes()
+        if options['endpoints']:
+            wanted = set(options['endpoints'])
+            routes = [(route, name) for route, name in routes if route in wanted or name in wanted]
+
+        started = time.monotonic()
+        # 分类索引只在命令中更新，预热前先补上新出现的 action
+        classified = refresh_action_categories()
+        self.stdout.write(f"Classified {classified} new actions")
+
+        timings = defaultdict(list)
+        failures = defaultdict(list)
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {
+                executor.submit(warm, name, query): (route, query)
+                for route, name in routes
+                for query in presets(ANALYTICS_ENDPOINTS[name].params)
+            }
+            for future in as_completed(futures):
+                route, query = futures[future]
+                try:
+                    status, elapsed = future.result()
+                except Exception as e:
+                    failures[route].append(f"{query}: {e}")
+                    continue
+                timings[route].append(elapsed)
+                if status != 200:
+                    failures[route].append(f"{query}: HTTP {status}")
+
+        for route, _ in routes:
+            elapsed = timings.get(route, [])
+            line = f"{route:<45} {len(elapsed):>3} presets  {sum(elapsed):7.2f}s total  {max(elapsed, default=0):7.2f}s max"
+            if failures.get(route):
+                self.stdout.write(self.style.WARNING(line))
+                for failure in failures[route]:
+                    self.stdout.write(f"    {failure}")
+            else:
+                self.stdout.write(line)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Warmed {len(routes)} endpoints in {time.monotonic() - started:.1f}s"
+        ))
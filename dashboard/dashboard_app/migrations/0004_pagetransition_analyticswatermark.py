@@ -0,0 +1,37 @@
+# Generated by Django 4.2.16 on 2026-10-18 16:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard_app', '0003_supportrequest_supportresponse'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PageTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('name', 'Action name'), ('url', 'Action URL')], max_length=10)),
+                ('day', models.DateField()),
+                ('source_idaction', models.IntegerField()),
+                ('target_idaction', models.IntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dimension', 'target_idaction'], name='dashboard_a_dimensi_da2280_idx')],
+                'unique_together': {('dimension', 'day', 'source_idaction', 'target_idaction')},
+            },
+        ),
+    ]
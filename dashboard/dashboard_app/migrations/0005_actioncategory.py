@@ -0,0 +1,20 @@
+# Generated by Django 4.2.16 on 2026-10-18 16:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard_app', '0004_pagetransition_analyticswatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActionCategory',
+            fields=[
+                ('idaction', models.IntegerField(primary_key=True, serialize=False)),
+                ('categories', models.PositiveIntegerField(db_index=True, default=0)),
+            ],
+        ),
+    ]
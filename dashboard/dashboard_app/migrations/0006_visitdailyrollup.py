@@ -0,0 +1,29 @@
+# Generated by Django 4.2.16 on 2026-10-18 16:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard_app', '0005_actioncategory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idsite', models.IntegerField()),
+                ('day', models.DateField()),
+                ('visits', models.PositiveIntegerField(default=0)),
+                ('unique_visitors', models.PositiveIntegerField(default=0)),
+                ('visitor_sketch', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='dashboard_a_day_7635b7_idx')],
+                'unique_together': {('idsite', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.16 on 2026-10-18 16:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard_app', '0006_visitdailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteIndexEntry',
+            fields=[
+                ('post_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('post_modified', models.DateTimeField()),
+                ('author', models.BigIntegerField(db_index=True)),
+                ('module', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('post_date', models.DateTimeField(db_index=True)),
+                ('content_length', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NoteTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='dashboard_app.noteindexentry')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term'], name='dashboard_a_term_db7fbe_idx')],
+                'unique_together': {('entry', 'term')},
+            },
+        ),
+    ]
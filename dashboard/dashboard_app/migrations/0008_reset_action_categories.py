@@ -0,0 +1,20 @@
+from django.db import migrations
+
+CATEGORY_WATERMARK = 'action_categories'
+
+
+def reset_action_categories(apps, schema_editor):
+    # 新增 COURSE_PATH 标志后需要重新分类；清空后在重建前读取会实时分类
+    apps.get_model('dashboard_app', 'ActionCategory').objects.all().delete()
+    apps.get_model('dashboard_app', 'AnalyticsWatermark').objects.filter(name=CATEGORY_WATERMARK).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard_app', '0007_noteindexentry_noteterm'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_action_categories, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.16 on 2026-10-18 17:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+NOTE_INDEX_WATERMARK = 'note_index'
+
+
+def reset_note_index(apps, schema_editor):
+    # 已索引的笔记只记录了第一个模块标签；清空后在重建前读取会实时统计
+    apps.get_model('dashboard_app', 'NoteIndexEntry').objects.all().delete()
+    apps.get_model('dashboard_app', 'AnalyticsWatermark').objects.filter(name=NOTE_INDEX_WATERMARK).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard_app', '0008_reset_action_categories'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_note_index, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='noteindexentry',
+            name='module',
+        ),
+        migrations.CreateModel(
+            name='NoteIndexModule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('module', models.CharField(db_index=True, max_length=255)),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='modules', to='dashboard_app.noteindexentry')),
+            ],
+        ),
+    ]
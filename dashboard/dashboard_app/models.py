@@ -367,4 +367,115 @@ class SupportResponse(models.Model):
         ordering = ['created_at']
     
     def __str__(self):
-        return f"Response to {self.support_request.subject} by {self.user.username}"
\ No newline at end of file
+        return f"Response to {self.support_request.subject} by {self.user.username}"
+
+class AnalyticsWatermark(models.Model):
+    """Last processed source row for each incrementally refreshed analytics table"""
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class PageTransition(models.Model):
+    """
+    Daily page-to-page transition counts built from the Matomo action log.
+    `dimension` tells which action column was followed: 'name' for
+    idaction_name, 'url' for idaction_url.
+    """
+    DIMENSION_CHOICES = (
+        ('name', 'Action name'),
+        ('url', 'Action URL'),
+    )
+
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    day = models.DateField()
+    source_idaction = models.IntegerField()
+    target_idaction = models.IntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['dimension', 'day', 'source_idaction', 'target_idaction']
+        indexes = [
+            models.Index(fields=['dimension', 'target_idaction']),
+        ]
+
+    def __str__(self):
+        return f"{self.source_idaction} -> {self.target_idaction} on {self.day} ({self.count})"
+
+
+class ActionCategory(models.Model):
+    """
+    Category bitmask for each Matomo action, see dashboard_app.action_categories
+    for the flag values.
+    """
+    idaction = models.IntegerField(primary_key=True)
+    categories = models.PositiveIntegerField(default=0, db_index=True)
+
+    def __str__(self):
+        return f"{self.idaction}: {self.categories}"
+
+
+class VisitDailyRollup(models.Model):
+    """
+    Daily Matomo visit totals per site. `visitor_sketch` is a HyperLogLog
+    of the day's visitors so unique counts can be merged across days.
+    """
+    idsite = models.IntegerField()
+    day = models.DateField()
+    visits = models.PositiveIntegerField(default=0)
+    unique_visitors = models.PositiveIntegerField(default=0)
+    visitor_sketch = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['idsite', 'day']
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+        return f"site {self.idsite} on {self.day}: {self.visits} visits"
+
+
+class NoteIndexEntry(models.Model):
+    """
+    Local copy of the attributes of a published WordPress note that the
+    word clouds filter on. `post_modified` tells the refresh whether the
+    note's terms are still current.
+    """
+    post_id = models.BigIntegerField(primary_key=True)
+    post_modified = models.DateTimeField()
+    author = models.BigIntegerField(db_index=True)
+    post_date = models.DateTimeField(db_index=True)
+    content_length = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"note {self.post_id}"
+
+
+class NoteIndexModule(models.Model):
+    """One `module_tag` of an indexed note; a note may carry several."""
+    entry = models.ForeignKey(NoteIndexEntry, on_delete=models.CASCADE, related_name='modules')
+    module = models.CharField(max_length=255, db_index=True)
+
+    def __str__(self):
+        return f"{self.module} on note {self.entry_id}"
+
+
+class NoteTerm(models.Model):
+    """Number of occurrences of a term in one indexed note."""
+    entry = models.ForeignKey(NoteIndexEntry, on_delete=models.CASCADE, related_name='terms')
+    term = models.CharField(max_length=100)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['entry', 'term']
+        indexes = [
+            models.Index(fields=['term']),
+        ]
+
+    def __str__(self):
+        return f"{self.term} x{self.count} in note {self.entry_id}"
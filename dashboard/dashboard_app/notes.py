@@ -0,0 +1,182 @@
+"""
+Bulk loading of module notes together with their images.
+
+A page of notes is assembled from four set-based queries on the wordpress
+database: the module's published notes, their `notes_img_*` metas, the
+referenced attachments and the attachments' `_wp_attached_file` metas.
+Pages are keyed on the post ID, so a module can be read in pages of any
+size without OFFSET scans.
+"""
+from django.conf import settings
+
+from .models import WPPost, WPPostMeta
+
+# Site serving the uploaded note images
+WORDPRESS_BASE_URL = "https://s4565901-balance-project.uqcloud.net"
+
+# Notes carry their images in notes_img_1 .. notes_img_5
+NOTE_IMAGE_SLOTS = 5
+
+NOTE_IMAGE_KEYS = [f'notes_img_{slot}' for slot in range(1, NOTE_IMAGE_SLOTS + 1)]
+
+# Largest page a client may request
+MODULE_NOTES_MAX_LIMIT = getattr(settings, 'MODULE_NOTES_MAX_LIMIT', 500)
+
+# Notes loaded per round of queries while streaming an export
+NOTES_EXPORT_BATCH_SIZE = 200
+
+
+def module_post_ids(module):
+    """Subquery of the post IDs tagged with `module`."""
+    return WPPostMeta.objects.using('wordpress').filter(
+        meta_key='module_tag',
+        meta_value=module
+    ).values('post_id')
+
+
+def _fallback_image(post_id, slot, image_id, note_date):
+    """Guessed upload URLs for an image whose attachment record is missing."""
+    year = note_date.strftime('%Y')
+    month = note_date.strftime('%m')
+    uploads = f"{WORDPRESS_BASE_URL}/wp-content/uploads/{year}/{month}"
+    return {
+        'id': image_id,
+        'url': f"{uploads}/output-{post_id}-{slot}.png",
+        'urls': [
+            f"{uploads}/output-{post_id}-{slot}.png",
+            f"{uploads}/output-{post_id}-{slot}.jpg",
+            f"{uploads}/{image_id}.png",
+            f"{uploads}/{image_id}.jpg",
+        ],
+        'fallback': True,
+        'year': year,
+        'month': month
+    }
+
+
+def _attachment_image(post_id, slot, image_id, attachment, file_path):
+    if file_path:
+        # 元数据中通常包含相对路径，如 "2025/04/image.jpg"
+        return {
+            'id': image_id,
+            'url': f"{WORDPRESS_BASE_URL}/wp-content/uploads/{file_path}",
+            'file_path': file_path
+        }
+
+    guid = attachment['guid']
+    if guid and 'wp-content/uploads/' in guid:
+        return {
+            'id': image_id,
+            'url': guid,
+            'file_path': guid.split('wp-content/uploads/')[-1]
+        }
+
+    year = attachment['post_date'].strftime('%Y')
+    month = attachment['post_date'].strftime('%m')
+    return {
+        'id': image_id,
+        'url': f"{WORDPRESS_BASE_URL}/wp-content/uploads/{year}/{month}/output-{post_id}-{slot}.png",
+        'fallback': True,
+        'year': year,
+        'month': month
+    }
+
+
+def load_module_notes(module, limit=None, cursor=None):
+    """
+    Load the published notes of `module` with their images.
+
+    Notes are ordered by post ID. `cursor` is the last ID of the previous
+    page and `limit` the page size (all remaining notes when omitted).
+    Returns `(notes, next_cursor)`, where `next_cursor` is None on the last
+    page.
+    """
+    posts = WPPost.objects.using('wordpress').filter(
+        ID__in=module_post_ids(module),
+        post_type='notes',
+        post_status='publish'
+    ).order_by('ID').values('ID', 'post_title', 'post_content', 'post_date', 'post_author')
+    if cursor is not None:
+        posts = posts.filter(ID__gt=cursor)
+    if limit is not None:
+        posts = posts[:limit + 1]
+    posts = list(posts)
+
+    next_cursor = None
+    if limit is not None and len(posts) > limit:
+        posts = posts[:limit]
+        next_cursor = posts[-1]['ID']
+    if not posts:
+        return [], None
+
+    # 每篇笔记每个图片位取第一条非空记录
+    image_refs = {}
+    image_metas = WPPostMeta.objects.using('wordpress').filter(
+        post_id__in=[post['ID'] for post in posts],
+        meta_key__in=NOTE_IMAGE_KEYS,
+        meta_value__isnull=False,
+        meta_value__gt=''
+    ).order_by('meta_id').values_list('post_id', 'meta_key', 'meta_value')
+    for post_id, meta_key, meta_value in image_metas:
+        image_refs.setdefault((post_id, meta_key), meta_value)
+
+    attachment_ids = {
+        int(image_id) for image_id in image_refs.values() if image_id.strip().isdigit()
+    }
+    attachments = {}
+    attached_files = {}
+    if attachment_ids:
+        attachments = {
+            attachment['ID']: attachment
+            for attachment in WPPost.objects.using('wordpress').filter(
+                ID__in=attachment_ids,
+                post_type='attachment'
+            ).values('ID', 'guid', 'post_date')
+        }
+    if attachments:
+        file_metas = WPPostMeta.objects.using('wordpress').filter(
+            post_id__in=list(attachments),
+            meta_key='_wp_attached_file'
+        ).order_by('meta_id').values_list('post_id', 'meta_value')
+        for attachment_id, file_path in file_metas:
+            attached_files.setdefault(attachment_id, file_path)
+
+    notes = []
+    for post in posts:
+        post_id = post['ID']
+        images = []
+        for slot, meta_key in enumerate(NOTE_IMAGE_KEYS, start=1):
+            image_id = image_refs.get((post_id, meta_key))
+            if image_id is None:
+                continue
+            attachment_id = int(image_id) if image_id.strip().isdigit() else None
+            attachment = attachments.get(attachment_id)
+            if attachment:
+                images.append(_attachment_image(
+                    post_id, slot, image_id, attachment, attached_files.get(attachment_id)
+                ))
+            else:
+                images.append(_fallback_image(post_id, slot, image_id, post['post_date']))
+
+        notes.append({
+            'id': post_id,
+            'title': post['post_title'],
+            'content': post['post_content'],
+            'date': post['post_date'],
+            'author': post['post_author'],
+            'images': images
+        })
+
+    return notes, next_cursor
+
+
+def iter_module_notes(module, batch_size=NOTES_EXPORT_BATCH_SIZE, cursor=None):
+    """
+    Yield every note of `module` after `cursor`, loading `batch_size` notes
+    at a time so memory stays bounded by one batch.
+    """
+    while True:
+        notes, cursor = load_module_notes(module, limit=batch_size, cursor=cursor)
+        yield from notes
+        if cursor is None:
+            return
@@ -0,0 +1,240 @@
+"""
+Full-text search over the published notes.
+
+Notes are copied into a local SQLite FTS5 index (title and HTML-stripped
+body), so phrase and term searches are answered from the index with bm25
+ranking and highlighted snippets instead of `LIKE '%..%'` scans on the
+remote MySQL. `refresh_notes_search` re-indexes notes whose
+`post_modified` changed and drops unpublished ones.
+"""
+import html
+import os
+import re
+import threading
+
+from django.conf import settings
+
+from .cache_backends import connect_private_sqlite
+from .text_index import all_module_tags, published_notes
+from .tokenizer import TAG_RE
+
+NOTES_SEARCH_PATH = getattr(
+    settings, 'NOTES_SEARCH_INDEX', os.path.join(settings.BASE_DIR, 'var', 'notes_search.sqlite3')
+)
+
+# Notes re-indexed per transaction
+NOTES_SEARCH_BATCH_SIZE = 500
+
+# Tokens of context on each side of a match in result snippets
+SNIPPET_TOKENS = 16
+
+# FTS5 marks matches with these control characters; the snippet is escaped
+# before they are turned into <mark> tags
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS note_fts USING fts5(
+    title, content, tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS note_doc (
+    post_id INTEGER PRIMARY KEY,
+    post_modified TEXT NOT NULL,
+    author INTEGER NOT NULL,
+    post_date TEXT NOT NULL,
+    module TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS note_doc_module ON note_doc (module);
+CREATE TABLE IF NOT EXISTS note_module (
+    post_id INTEGER NOT NULL,
+    module TEXT NOT NULL,
+    PRIMARY KEY (module, post_id)
+);
+"""
+
+# Bumped when indexed notes need re-indexing after a schema change:
+# 2 adds note_module, every module tag of a note
+SCHEMA_VERSION = 2
+
+QUERY_TERM_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+_local = threading.local()
+
+
+def _connection():
+    connection = getattr(_local, 'connection', None)
+    if connection is None:
+        connection = connect_private_sqlite(NOTES_SEARCH_PATH)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.executescript(SCHEMA)
+        if connection.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+            # 清空文档表，下次刷新会重新索引全部笔记
+            connection.executescript(f"""
+                BEGIN IMMEDIATE;
+                DELETE FROM note_doc;
+                DELETE FROM note_fts;
+                DELETE FROM note_module;
+                PRAGMA user_version = {SCHEMA_VERSION};
+                COMMIT;
+            """)
+        _local.connection = connection
+    return connection
+
+
+def plain_text(body):
+    """
+    Note body without HTML tags or entities and with collapsed whitespace.
+    The result may contain markup characters and must be escaped for HTML.
+    """
+    text = html.unescape(TAG_RE.sub(' ', body or ''))
+    return ' '.join(text.replace(MATCH_START, ' ').replace(MATCH_END, ' ').split())
+
+
+def highlight(snippet):
+    """HTML of a raw FTS5 snippet: text escaped, matches wrapped in <mark>."""
+    return (
+        html.escape(snippet)
+        .replace(MATCH_START, '<mark>')
+        .replace(MATCH_END, '</mark>')
+    )
+
+
+def match_expression(query):
+    """
+    Turn a user query into an FTS5 MATCH expression. Double-quoted parts
+    are phrases and every other word a term; all of them must match. Each
+    part is quoted, so FTS5 operators typed by users are matched literally.
+    Returns None when the query has no searchable text.
+    """
+    parts = []
+    for phrase, word in QUERY_TERM_RE.findall(query or ''):
+        text = (phrase or word).strip()
+        if text:
+            parts.append('"' + text.replace('"', '""') + '"')
+    return ' '.join(parts) or None
+
+
+def _index_notes(connection, post_ids):
+    posts = list(
+        published_notes()
+        .filter(ID__in=post_ids)
+        .values('ID', 'post_title', 'post_content', 'post_author', 'post_date', 'post_modified')
+    )
+    tags = all_module_tags([post['ID'] for post in posts])
+    placeholders = ','.join('?' * len(post_ids))
+
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        connection.execute(f'DELETE FROM note_fts WHERE rowid IN ({placeholders})', post_ids)
+        connection.execute(f'DELETE FROM note_doc WHERE post_id IN ({placeholders})', post_ids)
+        connection.execute(f'DELETE FROM note_module WHERE post_id IN ({placeholders})', post_ids)
+        connection.executemany(
+            'INSERT INTO note_fts (rowid, title, content) VALUES (?, ?, ?)',
+            [(post['ID'], post['post_title'] or '', plain_text(post['post_content'])) for post in posts]
+        )
+        connection.executemany(
+            'INSERT INTO note_doc (post_id, post_modified, author, post_date, module) VALUES (?, ?, ?, ?, ?)',
+            [
+                (
+                    post['ID'],
+                    post['post_modified'].isoformat(),
+                    post['post_author'],
+                    post['post_date'].isoformat(),
+                    next(iter(tags.get(post['ID'], [])), '')
+                )
+                for post in posts
+            ]
+        )
+        connection.executemany(
+            'INSERT INTO note_module (post_id, module) VALUES (?, ?)',
+            [(post['ID'], module) for post in posts for module in tags.get(post['ID'], [])]
+        )
+        connection.execute('COMMIT')
+    except Exception:
+        connection.execute('ROLLBACK')
+        raise
+    return len(posts)
+
+
+def refresh_notes_search(batch_size=NOTES_SEARCH_BATCH_SIZE):
+    """
+    Re-index new or modified notes and drop unpublished ones.
+    Returns `(indexed, removed)` note counts.
+    """
+    connection = _connection()
+    current = {
+        post_id: modified.isoformat()
+        for post_id, modified in published_notes().values_list('ID', 'post_modified')
+    }
+    indexed_at = dict(connection.execute('SELECT post_id, post_modified FROM note_doc'))
+
+    changed = sorted(
+        post_id for post_id, modified in current.items()
+        if indexed_at.get(post_id) != modified
+    )
+    removed = [post_id for post_id in indexed_at if post_id not in current]
+
+    indexed = 0
+    for start in range(0, len(changed), batch_size):
+        indexed += _index_notes(connection, changed[start:start + batch_size])
+    for start in range(0, len(removed), batch_size):
+        batch = removed[start:start + batch_size]
+        placeholders = ','.join('?' * len(batch))
+        connection.execute('BEGIN IMMEDIATE')
+        connection.execute(f'DELETE FROM note_fts WHERE rowid IN ({placeholders})', batch)
+        connection.execute(f'DELETE FROM note_doc WHERE post_id IN ({placeholders})', batch)
+        connection.execute(f'DELETE FROM note_module WHERE post_id IN ({placeholders})', batch)
+        connection.execute('COMMIT')
+    return indexed, len(removed)
+
+
+def search_notes(query, module=None, page=1, page_size=20):
+    """
+    Notes matching `query`, best bm25 match first.
+
+    Returns `(total, results)` where each result has the note's id, plain
+    text title, HTML-escaped snippet with matches in <mark>, module (the
+    requested one, else the note's first tag), author, date and score
+    (lower is better). `module` matches any of a note's tags.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return 0, []
+
+    where = 'note_fts MATCH ?'
+    params = [expression]
+    if module:
+        where += ' AND d.post_id IN (SELECT post_id FROM note_module WHERE module = ?)'
+        params.append(module)
+
+    connection = _connection()
+    total = connection.execute(
+        f'SELECT COUNT(*) FROM note_fts JOIN note_doc d ON d.post_id = note_fts.rowid WHERE {where}',
+        params
+    ).fetchone()[0]
+    rows = connection.execute(
+        f"""
+        SELECT d.post_id, note_fts.title,
+               snippet(note_fts, 1, ?, ?, '…', {SNIPPET_TOKENS}),
+               d.module, d.author, d.post_date, bm25(note_fts, 5.0, 1.0) AS score
+        FROM note_fts JOIN note_doc d ON d.post_id = note_fts.rowid
+        WHERE {where}
+        ORDER BY score
+        LIMIT ? OFFSET ?
+        """,
+        [MATCH_START, MATCH_END] + params + [page_size, (page - 1) * page_size]
+    ).fetchall()
+
+    results = [
+        {
+            'id': post_id,
+            'title': title,
+            'snippet': highlight(snippet),
+            'module': module or module_tag or None,
+            'author': author,
+            'date': post_date,
+            'score': round(score, 4)
+        }
+        for post_id, title, snippet, module_tag, author, post_date, score in rows
+    ]
+    return total, results
@@ -0,0 +1,158 @@
+"""
+Decoder for PHP `serialize()` output as stored in WordPress usermeta.
+
+WordPress keeps arrays such as `session_tokens` and `bookmarked_posts`
+serialized in `meta_value`. `unserialize` turns them into Python values and
+`decode_usermeta` memoizes the result per `(umeta_id, hash(meta_value))`,
+so the same blob is only parsed again once it changes or is evicted.
+"""
+from django.conf import settings
+
+from .lru import LRUCache
+
+
+# Deepest array/object nesting accepted; usermeta arrays are a few levels deep
+MAX_DEPTH = 32
+
+
+class PHPSerializeError(ValueError):
+    """Raised for data that is not valid PHP serialized output."""
+
+
+class _Parser:
+    # PHP string lengths count bytes, so parsing works on the UTF-8 encoding
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+        self.depth = 0
+
+    def error(self, message):
+        return PHPSerializeError(f"{message} at offset {self.pos}")
+
+    def read_until(self, delimiter):
+        end = self.data.find(delimiter, self.pos)
+        if end < 0:
+            raise self.error(f"Expected {delimiter!r}")
+        chunk = self.data[self.pos:end]
+        self.pos = end + 1
+        return chunk
+
+    def expect(self, token):
+        if self.data[self.pos:self.pos + len(token)] != token:
+            raise self.error(f"Expected {token!r}")
+        self.pos += len(token)
+
+    def read_int(self, delimiter):
+        chunk = self.read_until(delimiter)
+        try:
+            return int(chunk)
+        except ValueError:
+            raise self.error(f"Invalid integer {chunk!r}") from None
+
+    def read_string(self):
+        length = self.read_int(b':')
+        self.expect(b'"')
+        chunk = self.data[self.pos:self.pos + length]
+        if len(chunk) != length:
+            raise self.error("Truncated string")
+        self.pos += length
+        self.expect(b'"')
+        return chunk.decode('utf-8', errors='replace')
+
+    def read_members(self):
+        if self.depth >= MAX_DEPTH:
+            raise self.error(f"Nesting deeper than {MAX_DEPTH}")
+        count = self.read_int(b':')
+        self.expect(b'{')
+        self.depth += 1
+        members = {}
+        for _ in range(count):
+            key = self.value()
+            if not isinstance(key, (int, str)):
+                raise self.error("Invalid array key")
+            members[key] = self.value()
+        self.expect(b'}')
+        self.depth -= 1
+        return members
+
+    def value(self):
+        kind = self.data[self.pos:self.pos + 2]
+        self.pos += 2
+        if kind == b'N;':
+            return None
+        if kind == b'b:':
+            return self.read_int(b';') != 0
+        if kind == b'i:':
+            return self.read_int(b';')
+        if kind == b'd:':
+            chunk = self.read_until(b';')
+            try:
+                return float(chunk)
+            except ValueError:
+                raise self.error(f"Invalid float {chunk!r}") from None
+        if kind == b's:':
+            value = self.read_string()
+            self.expect(b';')
+            return value
+        if kind == b'a:':
+            return self.read_members()
+        if kind == b'O:':
+            # 对象只保留属性，类名丢弃
+            self.read_string()
+            self.expect(b':')
+            return self.read_members()
+        if kind in (b'r:', b'R:'):
+            # 引用指向已解析的值，用户元数据中基本不会出现
+            self.read_int(b';')
+            return None
+        self.pos -= 2
+        raise self.error(f"Unsupported type {kind!r}")
+
+
+def unserialize(data):
+    """
+    Decode a PHP serialized value. Arrays and objects become dicts keyed by
+    int or str in their serialized order; references decode to None.
+    Raises PHPSerializeError for malformed or trailing data and for nesting
+    deeper than MAX_DEPTH.
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    parser = _Parser(data)
+    value = parser.value()
+    if parser.pos != len(data):
+        raise parser.error("Trailing data")
+    return value
+
+
+def is_serialized(value):
+    """Cheap check for values worth handing to `unserialize`."""
+    return bool(value) and value[:2] in ('a:', 'O:', 's:', 'i:', 'b:', 'd:', 'N;')
+
+
+_MISSING = object()
+
+_decoded_usermeta = LRUCache(getattr(settings, 'USERMETA_DECODE_CACHE_SIZE', 10000))
+
+
+def decode_usermeta(umeta_id, meta_value):
+    """
+    Unserialized `meta_value` of a usermeta row, or None when it is empty
+    or not valid serialized data. Results are shared between requests and
+    must not be modified by callers.
+    """
+    if not is_serialized(meta_value):
+        return None
+    key = (umeta_id, hash(meta_value))
+    value = _decoded_usermeta.get(key, _MISSING)
+    if value is _MISSING:
+        try:
+            value = unserialize(meta_value)
+        except PHPSerializeError:
+            value = None
+        _decoded_usermeta.set(key, value)
+    return value
+
+
+def clear_usermeta_cache():
+    _decoded_usermeta.clear()
@@ -0,0 +1,29 @@
+"""
+Extra DRF renderers for the export endpoints.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Newline-delimited JSON, selected with `?format=ndjson`. A list is
+    written as one JSON document per line; any other payload (e.g. an error
+    response) as a single line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data if isinstance(data, list) else [data]
+        return b''.join(ndjson_line(item) for item in items)
+
+
+def ndjson_line(item):
+    """Encode one item as a line of newline-delimited JSON."""
+    return (json.dumps(item, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n').encode('utf-8')
@@ -1,3 +1,151 @@
-from django.test import TestCase
+import multiprocessing
+import os
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from . import analytics_cache, notes_search, text_index, views
+from .action_categories import COURSE, COURSE_PATH, LESSON, classify
+from .bundle import compute_bundle
+from .php_serialize import MAX_DEPTH, PHPSerializeError, decode_usermeta, unserialize
+
+
+class NotesSearchSnippetTests(SimpleTestCase):
+    """Search snippets are HTML: note text must come back escaped."""
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        patcher = mock.patch.object(notes_search, 'NOTES_SEARCH_PATH', self.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self._close)
+        notes_search._local.connection = None
+
+    def _close(self):
+        connection = getattr(notes_search._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+        notes_search._local.connection = None
+        os.remove(self.path)
+
+    def index(self, post_id, title, body):
+        connection = notes_search._connection()
+        connection.execute(
+            'INSERT INTO note_fts (rowid, title, content) VALUES (?, ?, ?)',
+            (post_id, title, notes_search.plain_text(body))
+        )
+        connection.execute(
+            'INSERT INTO note_doc (post_id, post_modified, author, post_date, module) VALUES (?, ?, ?, ?, ?)',
+            (post_id, '2024-01-01T00:00:00', 1, '2024-01-01T00:00:00', '')
+        )
+
+    def test_markup_in_note_body_is_escaped(self):
+        self.index(1, 'Tips', '<p>Use &lt;img src=x onerror=alert(1)&gt; in your notes about python</p>')
+
+        total, results = notes_search.search_notes('python')
+
+        self.assertEqual(total, 1)
+        snippet = results[0]['snippet']
+        self.assertNotIn('<img', snippet)
+        self.assertIn('&lt;img src=x onerror=alert(1)&gt;', snippet)
+        self.assertIn('<mark>python</mark>', snippet)
+
+    def test_marker_characters_in_note_body_are_not_highlighted(self):
+        self.index(1, 'Tips', 'plain \x02text\x03 about python')
+
+        _, results = notes_search.search_notes('python')
+
+        self.assertEqual(results[0]['snippet'].count('<mark>'), 1)
+
+
+class TermCountingPoolTests(SimpleTestCase):
+    """A broken worker pool falls back to counting in-process."""
+
+    texts = ['walking improves balance', 'balance and sleep', 'sleep routine'] * 250
+
+    def broken_pool(self):
+        # 每个工作进程启动即退出，首次取结果时抛出 BrokenProcessPool
+        return ProcessPoolExecutor(
+            max_workers=2,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=os._exit,
+            initargs=(1,)
+        )
+
+    def test_corpus_counts_survive_broken_pool(self):
+        with self.broken_pool() as executor:
+            counts = text_index.corpus_term_counts(self.texts, executor)
+
+        self.assertEqual(counts, text_index.corpus_term_counts(self.texts))
+
+    def test_note_counts_survive_broken_pool(self):
+        with self.broken_pool() as executor:
+            counts = text_index.note_term_counts(self.texts, executor)
+
+        self.assertEqual(len(counts), len(self.texts))
+        self.assertEqual(counts[0], Counter({'walking': 1, 'improves': 1, 'balance': 1}))
+
+
+class FoldedTermTests(SimpleTestCase):
+    """Terms a case/accent-insensitive collation equates are stored once."""
+
+    def test_accent_variants_merge_under_most_frequent_spelling(self):
+        counts = Counter({'café': 2, 'cafe': 1, 'cafÉ': 1, 'balance': 3})
+
+        merged = text_index.merge_folded_terms(counts)
+
+        self.assertEqual(merged, Counter({'café': 4, 'balance': 3}))
+
+
+class UnserializeDepthTests(SimpleTestCase):
+    """Hostile nesting is rejected instead of exhausting the stack."""
+
+    def nested(self, depth):
+        return 'a:1:{i:0;' * depth + 'i:1;' + '}' * depth
+
+    def test_nesting_up_to_limit_decodes(self):
+        value = unserialize(self.nested(MAX_DEPTH))
+        for _ in range(MAX_DEPTH):
+            value = value[0]
+        self.assertEqual(value, 1)
+
+    def test_deeper_nesting_is_rejected(self):
+        with self.assertRaises(PHPSerializeError):
+            unserialize(self.nested(MAX_DEPTH + 1))
+
+    def test_hostile_usermeta_decodes_to_none(self):
+        self.assertIsNone(decode_usermeta(-1, self.nested(100000)))
+
+
+class ActionClassificationTests(SimpleTestCase):
+    """Course keywords keep the matches of the original LIKE filters."""
+
+    def test_course_matches_anywhere(self):
+        self.assertTrue(classify('site.net/courses/sleep') & COURSE)
+        self.assertTrue(classify('My Course Notes') & COURSE)
+
+    def test_course_path_only_matches_course_urls(self):
+        self.assertTrue(classify('site.net/courses/sleep') & COURSE_PATH)
+        self.assertTrue(classify('SITE.NET/Course-intro') & COURSE_PATH)
+        self.assertFalse(classify('My Course Notes') & COURSE_PATH)
+        self.assertFalse(classify('site.net/lesson/my-course-recap') & COURSE_PATH)
+        self.assertTrue(classify('site.net/lesson/my-course-recap') & LESSON)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AnalyticsBundleTests(SimpleTestCase):
+    """Widgets are served through call_endpoint, without content negotiation."""
+
+    def test_module_notes_widget(self):
+        notes = [{'id': 7, 'title': 'Sleep', 'content': 'text', 'images': []}]
+        with mock.patch.object(analytics_cache, 'probe_watermark', return_value=(1,)), \
+                mock.patch.object(views, 'load_module_notes', return_value=(notes, None)):
+            results = compute_bundle([('notes', 'module_notes_content', {'module': 'sleep', 'limit': '10'})])
+
+        self.assertEqual(results['notes']['status'], 200)
+        self.assertEqual(results['notes']['data']['notes'], notes)
+        self.assertIsNone(results['notes']['data']['next_cursor'])
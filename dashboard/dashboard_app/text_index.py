@@ -0,0 +1,362 @@
+"""
+Term-frequency index over the published WordPress notes.
+
+Every note is tokenized once and its term counts are stored locally in
+NoteTerm, next to a NoteIndexEntry holding the attributes word clouds are
+filtered on (author, post date) and a NoteIndexModule row per module tag. `refresh_note_index` re-tokenizes
+only notes whose `post_modified` changed, so word clouds become aggregation
+queries over the index instead of passes over the whole corpus.
+
+Tokenizing is CPU-bound, so large batches are split into chunks counted on
+a process pool of NOTES_TEXT_WORKERS processes; with fewer than two workers,
+or when the pool breaks, everything is counted in-process.
+"""
+import logging
+import multiprocessing
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from datetime import datetime
+from functools import partial
+from itertools import repeat
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+from .aggregations import bucketed_histogram
+from .models import AnalyticsWatermark, NoteIndexEntry, NoteIndexModule, NoteTerm, WPPost, WPPostMeta
+from .notes import module_post_ids
+from .tokenizer import count_terms, count_terms_each, fold_term
+from .tokenizer import tokenize as tokenize_text
+
+logger = logging.getLogger('django')
+
+NOTE_INDEX_WATERMARK = 'note_index'
+
+# Notes re-tokenized per transaction
+NOTE_INDEX_BATCH_SIZE = 500
+
+# Words left out of every word cloud
+NOTES_STOP_WORDS = frozenset(getattr(settings, 'NOTES_STOP_WORDS', ()))
+
+# Processes counting terms of large note batches; 0 or 1 counts in-process
+NOTES_TEXT_WORKERS = getattr(settings, 'NOTES_TEXT_WORKERS', 0)
+
+# Note bodies handed to a worker process at a time
+NOTES_TEXT_CHUNK_SIZE = 200
+
+# Live word clouds over fewer notes than this are counted in-process
+NOTES_TEXT_PARALLEL_MIN = 2000
+
+# Content length buckets of note_text_analysis: (label, lower bound)
+NOTE_LENGTH_BUCKETS = (
+    ('0-5', 0),
+    ('6-10', 6),
+    ('11-20', 11),
+    ('21-50', 21),
+    ('51-100', 51),
+    ('100+', 101),
+)
+
+def tokenize(text):
+    """Word cloud terms of a note body, without NOTES_STOP_WORDS."""
+    return tokenize_text(text, NOTES_STOP_WORDS)
+
+
+@contextmanager
+def text_workers(workers=NOTES_TEXT_WORKERS):
+    """
+    Process pool for term counting, or None when counting in-process.
+    Workers are spawned fresh so they share no database connections with
+    this process.
+    """
+    if workers <= 1:
+        yield None
+        return
+    try:
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn')
+        )
+    except (OSError, ValueError) as e:
+        logger.warning(f"Counting note terms in-process, no worker pool: {e}")
+        yield None
+        return
+    with executor:
+        yield executor
+
+
+def _chunks(texts, size=NOTES_TEXT_CHUNK_SIZE):
+    chunk = []
+    for text in texts:
+        chunk.append(text)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _map_chunks(executor, func, texts):
+    """
+    Yield `func` of each chunk of `texts` in order. Spawned workers start
+    lazily, so a pool that cannot run surfaces here; the chunks it did not
+    finish are then counted in-process.
+    """
+    count = partial(func, stop_words=NOTES_STOP_WORDS)
+    if executor is None:
+        yield from map(count, _chunks(texts))
+        return
+
+    chunks = list(_chunks(texts))
+    done = 0
+    try:
+        for result in executor.map(func, chunks, repeat(NOTES_STOP_WORDS)):
+            yield result
+            done += 1
+    except (BrokenProcessPool, OSError) as e:
+        logger.warning(f"Term counting pool failed, counting in-process: {e}")
+        yield from map(count, chunks[done:])
+
+
+def corpus_term_counts(texts, executor=None):
+    """Counter of the terms of all `texts`, merged from per-chunk partials."""
+    counts = Counter()
+    for partial_counts in _map_chunks(executor, count_terms, texts):
+        counts.update(partial_counts)
+    return counts
+
+
+def note_term_counts(texts, executor=None):
+    """One Counter of terms per text, in order."""
+    counts = []
+    for chunk_counts in _map_chunks(executor, count_terms_each, texts):
+        counts.extend(chunk_counts)
+    return counts
+
+
+def most_common_terms(counts, limit=50):
+    """Top terms of a Counter, ties broken alphabetically like `top_terms`."""
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def published_notes():
+    return WPPost.objects.using('wordpress').filter(post_type='notes', post_status='publish')
+
+
+def module_tags(post_ids):
+    """First `module_tag` of each of the given posts."""
+    tags = {}
+    metas = WPPostMeta.objects.using('wordpress').filter(
+        post_id__in=post_ids,
+        meta_key='module_tag'
+    ).order_by('meta_id').values_list('post_id', 'meta_value')
+    for post_id, module in metas:
+        tags.setdefault(post_id, module or '')
+    return tags
+
+
+def all_module_tags(post_ids):
+    """Every distinct non-empty `module_tag` of each of the given posts."""
+    tags = {}
+    metas = WPPostMeta.objects.using('wordpress').filter(
+        post_id__in=post_ids,
+        meta_key='module_tag'
+    ).order_by('meta_id').values_list('post_id', 'meta_value')
+    for post_id, module in metas:
+        post_tags = tags.setdefault(post_id, [])
+        if module and module not in post_tags:
+            post_tags.append(module)
+    return tags
+
+
+def merge_folded_terms(counts):
+    """
+    Merge terms of one note that differ only in case or accents, which a
+    case- and accent-insensitive collation treats as duplicates. Each group
+    is stored under its most frequent spelling.
+    """
+    groups = {}
+    for term, count in counts.items():
+        groups.setdefault(fold_term(term), []).append((term, count))
+    merged = Counter()
+    for variants in groups.values():
+        spelling = min(variants, key=lambda item: (-item[1], item[0]))[0]
+        merged[spelling] = sum(count for _, count in variants)
+    return merged
+
+
+def _index_notes(post_ids, executor=None):
+    """Re-tokenize the given notes and replace their index rows."""
+    posts = list(
+        published_notes()
+        .filter(ID__in=post_ids)
+        .values('ID', 'post_content', 'post_author', 'post_date', 'post_modified')
+    )
+    tags = all_module_tags([post['ID'] for post in posts])
+    counts = note_term_counts([post['post_content'] for post in posts], executor)
+
+    entries = []
+    modules = []
+    terms = []
+    for post, post_counts in zip(posts, counts):
+        entry = NoteIndexEntry(
+            post_id=post['ID'],
+            post_modified=post['post_modified'],
+            author=post['post_author'],
+            post_date=post['post_date'],
+            content_length=len(post['post_content'] or '')
+        )
+        entries.append(entry)
+        modules.extend(
+            NoteIndexModule(entry=entry, module=module)
+            for module in tags.get(post['ID'], [])
+        )
+        terms.extend(
+            NoteTerm(entry=entry, term=term, count=count)
+            for term, count in merge_folded_terms(post_counts).items()
+        )
+
+    with transaction.atomic():
+        NoteIndexEntry.objects.filter(post_id__in=post_ids).delete()
+        NoteIndexEntry.objects.bulk_create(entries)
+        NoteIndexModule.objects.bulk_create(modules, batch_size=5000)
+        NoteTerm.objects.bulk_create(terms, batch_size=5000)
+    return len(entries)
+
+
+def refresh_note_index(batch_size=NOTE_INDEX_BATCH_SIZE):
+    """
+    Bring the index in line with the published notes: new or modified notes
+    are re-tokenized and notes that were deleted or unpublished are dropped.
+
+    Returns `(indexed, removed)` note counts.
+    """
+    current = dict(published_notes().values_list('ID', 'post_modified'))
+    indexed_at = dict(NoteIndexEntry.objects.values_list('post_id', 'post_modified'))
+
+    changed = sorted(
+        post_id for post_id, modified in current.items()
+        if indexed_at.get(post_id) != modified
+    )
+    removed = [post_id for post_id in indexed_at if post_id not in current]
+
+    indexed = 0
+    with text_workers(NOTES_TEXT_WORKERS if len(changed) > NOTES_TEXT_CHUNK_SIZE else 0) as executor:
+        for start in range(0, len(changed), batch_size):
+            indexed += _index_notes(changed[start:start + batch_size], executor)
+    for start in range(0, len(removed), batch_size):
+        NoteIndexEntry.objects.filter(post_id__in=removed[start:start + batch_size]).delete()
+
+    AnalyticsWatermark.objects.update_or_create(
+        name=NOTE_INDEX_WATERMARK, defaults={'value': int(time.time())}
+    )
+    return indexed, len(removed)
+
+
+def index_available():
+    """Whether the index has been built at least once."""
+    return AnalyticsWatermark.objects.filter(name=NOTE_INDEX_WATERMARK, value__gt=0).exists()
+
+
+def indexed_notes(user_id=None, module=None, start_date=None, end_date=None):
+    """
+    Index entries matching the word cloud filters. Dates bound whole days
+    inclusively; datetimes are used as exact inclusive bounds.
+    """
+    entries = NoteIndexEntry.objects.all()
+    if user_id is not None:
+        entries = entries.filter(author=user_id)
+    if module:
+        entries = entries.filter(
+            post_id__in=NoteIndexModule.objects.filter(module=module).values('entry')
+        )
+    if start_date:
+        lookup = 'post_date__gte' if isinstance(start_date, datetime) else 'post_date__date__gte'
+        entries = entries.filter(**{lookup: start_date})
+    if end_date:
+        lookup = 'post_date__lte' if isinstance(end_date, datetime) else 'post_date__date__lte'
+        entries = entries.filter(**{lookup: end_date})
+    return entries
+
+
+def top_terms(limit=50, **filters):
+    """
+    The `limit` most frequent terms of the notes matching `filters` (see
+    `indexed_notes`) as `[(term, count), ...]`.
+    """
+    rows = (
+        NoteTerm.objects
+        .filter(entry__in=indexed_notes(**filters))
+        .values('term')
+        .annotate(total=Sum('count'))
+        .order_by('-total', 'term')[:limit]
+    )
+    return [(row['term'], row['total']) for row in rows]
+
+
+def _live_note_stats(limit, user_id=None, module=None, start_date=None, end_date=None):
+    notes = published_notes()
+    if user_id is not None:
+        notes = notes.filter(post_author=user_id)
+    if module:
+        notes = notes.filter(ID__in=module_post_ids(module))
+    if start_date:
+        notes = notes.filter(post_date__date__gte=start_date)
+    if end_date:
+        notes = notes.filter(post_date__date__lte=end_date)
+
+    workers = NOTES_TEXT_WORKERS if notes.count() >= NOTES_TEXT_PARALLEL_MIN else 0
+    lengths = Counter()
+    dates = Counter()
+
+    def bodies():
+        for content, post_date in notes.values_list('post_content', 'post_date').iterator():
+            length = len(content or '')
+            for label, lower in reversed(NOTE_LENGTH_BUCKETS):
+                if length >= lower:
+                    lengths[label] += 1
+                    break
+            dates[post_date.strftime('%Y-%m-%d')] += 1
+            yield content
+
+    with text_workers(workers) as executor:
+        words = corpus_term_counts(bodies(), executor)
+
+    return (
+        most_common_terms(words, limit),
+        [(label, lengths[label]) for label, _ in NOTE_LENGTH_BUCKETS],
+        dict(dates)
+    )
+
+
+def note_text_stats(limit=50, **filters):
+    """
+    Word cloud, content length buckets and notes per day for the notes
+    matching `filters` (see `indexed_notes`).
+
+    Returns `(top_terms, [(length bucket, count), ...], {date: count})`.
+    Until the index has been built the notes are tokenized live.
+    """
+    if not index_available():
+        return _live_note_stats(limit, **filters)
+
+    entries = indexed_notes(**filters)
+    lengths = bucketed_histogram(
+        entries, 'content_length', [lower for _, lower in NOTE_LENGTH_BUCKETS]
+    )
+    dates = (
+        entries
+        .annotate(date=TruncDate('post_date'))
+        .values('date')
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
+    return (
+        top_terms(limit, **filters),
+        [(label, count) for (label, _), count in zip(NOTE_LENGTH_BUCKETS, lengths)],
+        {row['date'].strftime('%Y-%m-%d'): row['count'] for row in dates}
+    )
@@ -0,0 +1,54 @@
+"""
+Word cloud tokenization of note bodies.
+
+This module does not import Django, so term counting can run in worker
+processes that never set Django up (see `text_index.text_workers`).
+"""
+import re
+import unicodedata
+from collections import Counter
+
+# Longest term kept; NoteTerm.term holds at most this many characters
+MAX_TERM_LENGTH = 100
+
+TAG_RE = re.compile(r'<[^>]*>')
+NON_WORD_RE = re.compile(r'[^\w\s]')
+
+
+def tokenize(text, stop_words=frozenset()):
+    """
+    Split a note body into word cloud terms: HTML tags and punctuation are
+    removed, text is lower-cased and words of up to 3 characters or in
+    `stop_words` are dropped.
+    """
+    if not text:
+        return []
+    text = TAG_RE.sub(' ', text)
+    text = NON_WORD_RE.sub(' ', text.lower())
+    return [
+        word for word in text.split()
+        if 3 < len(word) <= MAX_TERM_LENGTH and word not in stop_words
+    ]
+
+
+def count_terms(texts, stop_words=frozenset()):
+    """Counter of the terms of all `texts` together."""
+    counts = Counter()
+    for text in texts:
+        counts.update(tokenize(text, stop_words))
+    return counts
+
+
+def count_terms_each(texts, stop_words=frozenset()):
+    """One Counter of terms per text."""
+    return [Counter(tokenize(text, stop_words)) for text in texts]
+
+
+def fold_term(term):
+    """
+    Comparison key of a term under an accent- and case-insensitive
+    collation such as MySQL's utf8mb4 `_ai_ci`: terms with equal keys are
+    the same value to a unique index on NoteTerm.term.
+    """
+    decomposed = unicodedata.normalize('NFKD', term)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
@@ -0,0 +1,255 @@
+"""
+Page-to-page transition counting over the Matomo action log.
+
+The log is read in a single pass ordered by (idvisit, server_time), so a
+transition is simply two consecutive rows of the same visit. Counts are kept
+by action ID while streaming and names are only resolved once at the end.
+
+`refresh_page_transitions` keeps a daily PageTransition matrix up to date
+from the same log, so endpoints can read stored counts instead of scanning.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Sum
+
+from .action_cache import action_dictionary
+from .models import AnalyticsWatermark, MatomoLogLinkVisitAction, PageTransition
+
+# Rows fetched per round trip while streaming the log
+TRANSITION_CHUNK_SIZE = 5000
+
+# New log rows folded into the transition matrix per refresh step
+TRANSITION_REFRESH_BATCH_SIZE = 20000
+
+TRANSITION_WATERMARK = 'page_transitions'
+
+# PageTransition.dimension -> action log column it follows
+DIMENSION_FIELDS = {
+    'name': 'idaction_name',
+    'url': 'idaction_url',
+}
+
+
+def count_transitions(field='idaction_name', queryset=None, target_ids=None,
+                      chunk_size=TRANSITION_CHUNK_SIZE):
+    """
+    Count source -> target transitions between consecutive actions of a visit.
+
+    `field` selects the action column to follow (`idaction_name` or
+    `idaction_url`). `queryset` narrows the scanned rows, and `target_ids`
+    keeps only transitions that land on one of the given actions. A pair is
+    skipped when either side has no action ID.
+
+    Returns a Counter keyed by (source_idaction, target_idaction).
+    """
+    if queryset is None:
+        queryset = MatomoLogLinkVisitAction.objects.all()
+    if target_ids is not None:
+        target_ids = set(target_ids)
+
+    rows = (
+        queryset
+        .order_by('idvisit', 'server_time', 'idlink_va')
+        .values_list('idvisit', field)
+        .iterator(chunk_size=chunk_size)
+    )
+
+    counts = Counter()
+    current_visit = None
+    previous = None
+    for visit_id, action_id in rows:
+        if visit_id != current_visit:
+            current_visit = visit_id
+            previous = action_id
+            continue
+
+        if previous is not None and action_id is not None:
+            if target_ids is None or action_id in target_ids:
+                counts[(previous, action_id)] += 1
+        previous = action_id
+
+    return counts
+
+
+def _log_rows(queryset):
+    return queryset.values_list(
+        'idlink_va', 'idvisit', 'server_time', 'idaction_name', 'idaction_url'
+    )
+
+
+def _fold_visit(counts, dimension, previous, rows):
+    """
+    Add the transitions of one visit's new rows to `counts`.
+
+    `previous` is the visit's last action before these rows. For the name
+    dimension rows without a page name are skipped entirely, matching the
+    `idaction_name__isnull=False` scan used by the navigation paths.
+    """
+    index = 3 if dimension == 'name' else 4
+    for row in rows:
+        action_id = row[index]
+        if dimension == 'name' and action_id is None:
+            continue
+        if previous is not None and action_id is not None:
+            counts[(dimension, row[2].date(), previous, action_id)] += 1
+        previous = action_id
+    return previous
+
+
+def _store_transition_counts(counts):
+    """Add `counts` onto the stored matrix, creating missing cells."""
+    grouped = defaultdict(dict)
+    for (dimension, day, source_id, target_id), count in counts.items():
+        grouped[(dimension, day)][(source_id, target_id)] = count
+
+    for (dimension, day), pairs in grouped.items():
+        existing = PageTransition.objects.filter(
+            dimension=dimension,
+            day=day,
+            source_idaction__in={source_id for source_id, _ in pairs},
+            target_idaction__in={target_id for _, target_id in pairs},
+        )
+        updated = []
+        for cell in existing:
+            key = (cell.source_idaction, cell.target_idaction)
+            if key in pairs:
+                cell.count += pairs.pop(key)
+                updated.append(cell)
+
+        PageTransition.objects.bulk_update(updated, ['count'])
+        PageTransition.objects.bulk_create([
+            PageTransition(
+                dimension=dimension,
+                day=day,
+                source_idaction=source_id,
+                target_idaction=target_id,
+                count=count,
+            )
+            for (source_id, target_id), count in pairs.items()
+        ])
+
+
+def refresh_page_transitions(batch_size=TRANSITION_REFRESH_BATCH_SIZE):
+    """
+    Fold action log rows above the stored `idlink_va` watermark into the
+    PageTransition matrix. Each batch is committed together with the new
+    watermark, so an interrupted refresh resumes where it stopped. The
+    watermark row is locked while a batch is stored, and a batch is dropped
+    when another refresh moved the watermark meanwhile.
+
+    Returns the number of log rows processed.
+    """
+    processed = 0
+    while True:
+        watermark, _ = AnalyticsWatermark.objects.get_or_create(name=TRANSITION_WATERMARK)
+        rows = list(_log_rows(
+            MatomoLogLinkVisitAction.objects
+            .filter(idlink_va__gt=watermark.value)
+            .order_by('idlink_va')[:batch_size]
+        ))
+        if not rows:
+            return processed
+
+        new_rows = defaultdict(list)
+        for row in rows:
+            new_rows[row[1]].append(row)
+
+        # Last action each visit reached before this batch
+        last_name = {}
+        last_url = {}
+        earlier_rows = _log_rows(
+            MatomoLogLinkVisitAction.objects
+            .filter(idvisit__in=list(new_rows), idlink_va__lte=watermark.value)
+            .order_by('idvisit', 'server_time', 'idlink_va')
+        )
+        for _, visit_id, _, name_id, url_id in earlier_rows:
+            if name_id is not None:
+                last_name[visit_id] = name_id
+            last_url[visit_id] = url_id
+
+        counts = Counter()
+        for visit_id, visit_rows in new_rows.items():
+            visit_rows.sort(key=lambda row: (row[2], row[0]))
+            _fold_visit(counts, 'name', last_name.get(visit_id), visit_rows)
+            _fold_visit(counts, 'url', last_url.get(visit_id), visit_rows)
+
+        with transaction.atomic():
+            # 并发刷新时只有持锁且水位未变的一方写入，避免同一批重复累加
+            locked = AnalyticsWatermark.objects.select_for_update().get(pk=watermark.pk)
+            if locked.value != watermark.value:
+                continue
+            _store_transition_counts(counts)
+            locked.value = rows[-1][0]
+            locked.save()
+
+        processed += len(rows)
+
+
+def transition_counts(dimension, target_ids=None, start_date=None, end_date=None):
+    """
+    Transition counts for `dimension` from the stored matrix, optionally
+    limited to target actions and an inclusive day range.
+
+    Until the matrix has been built by `refresh_page_transitions`, the counts
+    are computed from the raw log instead.
+    """
+    if not AnalyticsWatermark.objects.filter(name=TRANSITION_WATERMARK, value__gt=0).exists():
+        field = DIMENSION_FIELDS[dimension]
+        queryset = MatomoLogLinkVisitAction.objects.all()
+        if dimension == 'name':
+            queryset = queryset.filter(idaction_name__isnull=False)
+        if start_date:
+            queryset = queryset.filter(server_time__date__gte=start_date)
+        if end_date:
+            queryset = queryset.filter(server_time__date__lte=end_date)
+        return count_transitions(field=field, queryset=queryset, target_ids=target_ids)
+
+    cells = PageTransition.objects.filter(dimension=dimension)
+    if target_ids is not None:
+        cells = cells.filter(target_idaction__in=target_ids)
+    if start_date:
+        cells = cells.filter(day__gte=start_date)
+    if end_date:
+        cells = cells.filter(day__lte=end_date)
+
+    totals = cells.values('source_idaction', 'target_idaction').annotate(total=Sum('count'))
+    return Counter({
+        (cell['source_idaction'], cell['target_idaction']): cell['total']
+        for cell in totals
+    })
+
+
+def aggregate_transitions(counts, clean=False):
+    """
+    Turn transition counts into `{'source', 'target', 'count'}` rows.
+
+    Action IDs are resolved in bulk through the action dictionary; pairs
+    referencing unknown actions are dropped. With `clean` the cleaned URL
+    path is reported instead of the raw name, and pairs that end up with the
+    same labels are merged.
+    """
+    action_ids = set()
+    for source_id, target_id in counts:
+        action_ids.add(source_id)
+        action_ids.add(target_id)
+    entries = action_dictionary.get_many(action_ids)
+
+    aggregated = {}
+    for (source_id, target_id), count in counts.items():
+        if source_id not in entries or target_id not in entries:
+            continue
+        if clean:
+            source = entries[source_id].path
+            target = entries[target_id].path
+        else:
+            source = entries[source_id].name
+            target = entries[target_id].name
+
+        key = (source, target)
+        if key in aggregated:
+            aggregated[key]['count'] += count
+        else:
+            aggregated[key] = {'source': source, 'target': target, 'count': count}
+
+    return list(aggregated.values())
@@ -24,6 +24,7 @@ urlpatterns = [
         path('note-upload-trends/', views.note_upload_trends, name='note_upload_trends'),
         path('module-notes-content/', views.module_notes_content, name='module_notes_content'),
         path('notes/statistics/', views.notes_statistics, name='notes_statistics'),
+        path('notes/search/', views.notes_search, name='notes_search'),
         path('user-favorites/', views.user_favorites, name='user-favorites'),
         path('module-completion-status/', views.module_completion_status, name='module-completion-status'),
         path('session-activity/', views.session_activity, name='session-activity'),
@@ -49,6 +50,7 @@ urlpatterns = [
         path('analytics/learning-time-distribution/', views.learning_time_distribution, name='learning_time'),
         path('analytics/visit-trends/', views.visit_trends, name='visit_trends'),
         path('analytics/popular-content/', views.popular_content, name='popular_content'),
+        path('analytics/bundle/', views.analytics_bundle, name='analytics_bundle'),
         path('user-content-interaction/', views.user_content_interaction, name='user_content_interaction'),
         path('support-requests/', views.support_requests, name='support_requests'),
         path('support-requests/<int:ticket_id>/', views.support_request_detail, name='support_request_detail'),
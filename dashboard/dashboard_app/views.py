@@ -4,6 +4,8 @@ import logging
 import json
 import uuid
 import hashlib
+import time
+from array import array
 from datetime import datetime, timedelta, date
 from collections import Counter, defaultdict
 from django.forms.models import model_to_dict
@@ -11,7 +13,7 @@ import os
 import psutil
 import platform
 import django
-from urllib.parse import urlparse
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 # Django core imports
 from django.conf import settings
 from django.core.cache import cache
@@ -23,13 +25,13 @@ from django.contrib.auth.models import User, Group
 from django.db import connections, models, transaction, IntegrityError
 from django.db.models import (
     Count, Sum, Avg, Min, Max, F, Q, 
-    ExpressionWrapper, Value, CharField, DateField
+    ExpressionWrapper, Value, CharField, DateField, Case, When
 )
 from django.db.models.functions import (
     TruncDate, TruncWeek, TruncMonth, TruncYear,
-    Cast, Coalesce, Concat
+    Cast, Coalesce, Concat, Substr
 )
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.template.loader import render_to_string
 from django.utils import timezone
@@ -38,14 +40,35 @@ from django.utils.text import slugify
 
 # Django REST Framework imports
 from rest_framework import status, viewsets, permissions, filters, pagination
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.decorators import api_view, permission_classes, renderer_classes, action
+from rest_framework.renderers import JSONRenderer, BrowsableAPIRenderer
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from django.middleware.csrf import get_token
 # Local application imports
-from .models import WPUser, WPUserMeta, WPComments, SecurityQuestion, WPPost, WPPostMeta, UserPreference ,MatomoLogVisit, MatomoLogAction, MatomoLogLinkVisitAction, SupportRequest, SupportResponse, WPTerms 
+from .models import WPUser, WPUserMeta, WPComments, SecurityQuestion, WPPost, WPPostMeta, UserPreference ,MatomoLogVisit, MatomoLogLinkVisitAction, SupportRequest, SupportResponse, WPTerms 
+from .transitions import transition_counts, aggregate_transitions
+from .action_cache import action_dictionary
+from .aggregations import (
+    combined_weekly_heatmap, bucketed_histogram, TimeZoneConversionError,
+    FromUnixTime, unix_timestamp, period_trunc
+)
+from .analytics_cache import cached_analytics
+from .visit_rollup import rollup_available, visit_totals
+from .notes import MODULE_NOTES_MAX_LIMIT, iter_module_notes, load_module_notes
+from .renderers import NDJSONRenderer, ndjson_line
+from .php_serialize import decode_usermeta
+from .notes_search import search_notes
+from .text_index import (
+    index_available, module_tags, most_common_terms, note_text_stats, top_terms, tokenize
+)
+from .bundle import ANALYTICS_BUNDLE_MAX_WIDGETS, compute_bundle, resolve_widget
+from .action_categories import (
+    NOTE, COMMENT, FORUM, COURSE, COURSE_PATH, LESSON, MODULE,
+    category_action_id_chunks, category_action_ids, category_masks, interaction_type
+)
 
 # Set up loggers
 logger = logging.getLogger('django')
@@ -407,6 +430,7 @@ def api_dashboard(request):
 
 # Get active users
 @api_view(['GET'])
+@cached_analytics('usermeta')
 def get_active_users(request):
     """
     Count active users with login count >= 1
@@ -416,6 +440,7 @@ def get_active_users(request):
     return Response({"active_users": active_users})
 
 @api_view(['GET'])
+@cached_analytics('posts')
 def get_total_notes(request):
     """
     Calculate total number of published notes
@@ -430,6 +455,7 @@ def get_total_notes(request):
 
 # Count feedback messages
 @api_view(['GET'])
+@cached_analytics('comments')
 def get_feedback_count(request):
     """
     Count all users' feedback messages (based on `wp_comments` table)
@@ -441,6 +467,7 @@ def get_feedback_count(request):
 
 
 @api_view(['GET'])
+@cached_analytics('usermeta', params=('interval', 'start_date', 'end_date'))
 def user_activity_trends(request):
     """
     获取用户注册和活动趋势数据
@@ -464,71 +491,40 @@ def user_activity_trends(request):
         start_timestamp = int(start_date.timestamp())
         end_timestamp = int(end_date.timestamp())
         
-        # 根据间隔选择截断函数
-        if interval == 'day':
-            date_trunc = TruncDate('user_registered')
-        elif interval == 'week':
-            date_trunc = TruncWeek('user_registered')
-        elif interval == 'month':
-            date_trunc = TruncMonth('user_registered')
-        else:  # year
-            date_trunc = TruncYear('user_registered')
+        if interval not in ('day', 'week', 'month', 'year'):
+            interval = 'year'
         
         # 获取新用户注册数据
         registrations = WPUser.objects.using('wordpress').filter(
             user_registered__gte=start_date,
             user_registered__lte=end_date
         ).annotate(
-            date=date_trunc
+            date=period_trunc('user_registered', interval)
         ).values('date').annotate(
             count=Count('ID')
-        ).order_by('date')
+        ).order_by()
+        reg_counts = defaultdict(int)
+        for item in registrations:
+            reg_counts[item['date'].strftime('%Y-%m-%d')] += item['count']
         
-        # 获取活跃用户数据 - 使用数值比较而不是日期比较
-        # 注意：我们需要将字符串类型的 meta_value 转换为数值后再比较
+        # 获取活跃用户数据 - tutor_last_login 是Unix时间戳字符串，
+        # 在数据库中转换为数值和日期后再按周期分组
         active_users = WPUserMeta.objects.using('wordpress').filter(
             meta_key='tutor_last_login',
-            meta_value__gte=str(start_timestamp),  # 确保作为字符串比较
-            meta_value__lte=str(end_timestamp)     # 确保作为字符串比较
-        )
-        
-        # 整理活跃用户数据
-        active_data = []
-        if active_users.exists():
-            # 我们需要手动分组，因为meta_value是时间戳字符串
-            active_counts = {}
-            
-            for user in active_users:
-                try:
-                    # 将时间戳转换为datetime对象
-                    timestamp = int(user.meta_value)
-                    date = datetime.fromtimestamp(timestamp)
-                    
-                    # 根据间隔截断日期
-                    if interval == 'day':
-                        date_key = date.strftime('%Y-%m-%d')
-                    elif interval == 'week':
-                        # 获取该周的第一天
-                        date_key = (date - timedelta(days=date.weekday())).strftime('%Y-%m-%d')
-                    elif interval == 'month':
-                        date_key = date.strftime('%Y-%m-01')
-                    else:  # year
-                        date_key = date.strftime('%Y-01-01')
-                    
-                    if date_key in active_counts:
-                        active_counts[date_key] += 1
-                    else:
-                        active_counts[date_key] = 1
-                except (ValueError, TypeError):
-                    # 忽略无效的时间戳
-                    continue
-            
-            # 转换为列表格式
-            for date_key, count in active_counts.items():
-                active_data.append({
-                    'date': date_key,
-                    'count': count
-                })
+            meta_value__regex=r'^[0-9]+$'
+        ).annotate(
+            login_ts=unix_timestamp('meta_value')
+        ).filter(
+            login_ts__gte=start_timestamp,
+            login_ts__lte=end_timestamp
+        ).annotate(
+            date=period_trunc(FromUnixTime('login_ts'), interval)
+        ).values('date').annotate(
+            count=Count('umeta_id')
+        ).order_by()
+        active_counts = defaultdict(int)
+        for item in active_users:
+            active_counts[item['date'].strftime('%Y-%m-%d')] += item['count']
         
         # 创建日期范围填充缺失的数据
         all_dates = []
@@ -562,36 +558,14 @@ def user_activity_trends(request):
             all_dates.append(date_str)
         
         # 合并数据
-        result = []
-        for date_str in all_dates:
-            # 查找该日期的新用户数
-            reg_count = 0
-            for reg in registrations:
-                if interval == 'day':
-                    reg_date_str = reg['date'].strftime('%Y-%m-%d')
-                elif interval == 'week':
-                    reg_date_str = reg['date'].strftime('%Y-%m-%d')
-                elif interval == 'month':
-                    reg_date_str = reg['date'].strftime('%Y-%m-01')
-                else:  # year
-                    reg_date_str = reg['date'].strftime('%Y-01-01')
-                
-                if reg_date_str == date_str:
-                    reg_count = reg['count']
-                    break
-            
-            # 查找该日期的活跃用户数
-            active_count = 0
-            for active in active_data:
-                if active['date'] == date_str:
-                    active_count = active['count']
-                    break
-            
-            result.append({
+        result = [
+            {
                 'date': date_str,
-                'newUsers': reg_count,
-                'activeUsers': active_count
-            })
+                'newUsers': reg_counts.get(date_str, 0),
+                'activeUsers': active_counts.get(date_str, 0)
+            }
+            for date_str in all_dates
+        ]
         
         return Response(result)
     
@@ -614,63 +588,35 @@ def user_activity_trends(request):
 
 
 @api_view(['GET'])
+@cached_analytics(('posts', 'note_index'), params=('user_id', 'module', 'start_date', 'end_date'))
 def note_text_analysis(request):
     """
     API endpoint for text-based visualization of notes
+
+    Optional `user_id`, `module` and `start_date`/`end_date` narrow the
+    notes. Results come from the term-frequency index once it is built.
     """
     try:
-        # Fetch published notes
-        notes = WPPost.objects.using('wordpress').filter(
-            post_type='notes', 
-            post_status='publish'
-        ).values('ID', 'post_title', 'post_content', 'post_date')
-        
-        # Prepare for analysis
-        word_counts = []
-        content_lengths = []
-        date_counts = {}
-
-        for note in notes:
-            # Clean HTML tags if needed (currently just lowercasing)
-            content = note['post_content'].lower() if note['post_content'] else ''
-            words = [w for w in content.split() if len(w) > 3]
-            word_counts.extend(words)
-
-            # Record content length
-            content_lengths.append(len(content))
-
-            # Group by date
-            date_str = note['post_date'].strftime('%Y-%m-%d')
-            if date_str in date_counts:
-                date_counts[date_str] += 1
-            else:
-                date_counts[date_str] = 1
-
-        # Top 50 common words
-        common_words = Counter(word_counts).most_common(50)
-
-        # Custom content length distribution
-        length_distribution = Counter()
-        for length in content_lengths:
-            if length <= 5:
-                bucket = '0-5'
-            elif length <= 10:
-                bucket = '6-10'
-            elif length <= 20:
-                bucket = '11-20'
-            elif length <= 50:
-                bucket = '21-50'
-            elif length <= 100:
-                bucket = '51-100'
-            else:
-                bucket = '100+'
-            length_distribution[bucket] += 1
+        start_date, end_date = parse_date_range(request)
+        user_id = request.query_params.get('user_id')
+        user_id = int(user_id) if user_id else None
+    except ValueError:
+        return Response({"error": "Invalid user_id or date. Use YYYY-MM-DD dates."}, status=400)
+
+    try:
+        common_words, length_distribution, date_counts = note_text_stats(
+            50,
+            user_id=user_id,
+            module=request.query_params.get('module'),
+            start_date=start_date,
+            end_date=end_date
+        )
 
         # Build response
         return Response({
             'word_frequency': common_words,
             'content_length_distribution': [
-                {'length': k, 'count': v} for k, v in length_distribution.items()
+                {'length': k, 'count': v} for k, v in length_distribution if v
             ],
             'date_distribution': [
                 {'date': k, 'count': v} for k, v in sorted(date_counts.items())
@@ -684,6 +630,7 @@ def note_text_analysis(request):
         )
 
 @api_view(['GET'])
+@cached_analytics('posts')
 def model_note_relationship(request):
     """
     API endpoint for model and note relationship visualization
@@ -719,6 +666,7 @@ def model_note_relationship(request):
         )
 
 @api_view(['GET'])
+@cached_analytics('posts', params=('interval', 'start_date', 'end_date'))
 def note_upload_trends(request):
     """
     API endpoint for note upload trend visualization
@@ -726,60 +674,71 @@ def note_upload_trends(request):
     try:
         # 获取请求参数
         interval = request.query_params.get('interval', 'day')
-        start_date = request.query_params.get('start_date', None)
-        end_date = request.query_params.get('end_date', None)
+        try:
+            start_date, end_date = parse_date_range(request)
+        except ValueError:
+            return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
         
         # 设置默认时间范围
         if not start_date:
-            start_date = (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d')
+            start_date = (datetime.now() - timedelta(days=365)).date()
         if not end_date:
-            end_date = datetime.now().strftime('%Y-%m-%d')
-        
-        # 准备查询
-        notes = WPPost.objects.using('wordpress').filter(post_type='notes', post_status='publish')
-        
-        # 根据间隔聚合数据
-        if interval == 'day':
-            trends = notes.annotate(date=TruncDate('post_date')).values('date').annotate(count=Count('ID')).order_by('date')
-        elif interval == 'week':
-            trends = notes.annotate(date=TruncWeek('post_date')).values('date').annotate(count=Count('ID')).order_by('date')
-        elif interval == 'month':
-            trends = notes.annotate(date=TruncMonth('post_date')).values('date').annotate(count=Count('ID')).order_by('date')
-        else:  # year
-            trends = notes.annotate(date=TruncYear('post_date')).values('date').annotate(count=Count('ID')).order_by('date')
+            end_date = datetime.now().date()
+        
+        date_trunc = {
+            'day': TruncDate,
+            'week': TruncWeek,
+            'month': TruncMonth,
+        }.get(interval, TruncYear)
+        
+        # 两次分组查询：整体趋势按笔记分组；模块趋势从 module_tag 元数据正向关联笔记，
+        # 每个标签一行，带多个标签的笔记计入每个模块
+        overall = (
+            WPPost.objects.using('wordpress')
+            .filter(
+                post_type='notes',
+                post_status='publish',
+                post_date__date__gte=start_date,
+                post_date__date__lte=end_date
+            )
+            .annotate(date=date_trunc('post_date'))
+            .values('date')
+            .annotate(count=Count('ID'))
+            .order_by('date')
+        )
+        module_rows = (
+            WPPostMeta.objects.using('wordpress')
+            .filter(
+                meta_key='module_tag',
+                meta_value__isnull=False,
+                meta_value__gt='',
+                post__post_type='notes',
+                post__post_status='publish',
+                post__post_date__date__gte=start_date,
+                post__post_date__date__lte=end_date
+            )
+            .annotate(date=date_trunc('post__post_date'))
+            .values('meta_value', 'date')
+            .annotate(count=Count('post', distinct=True))
+            .order_by('meta_value', 'date')
+        )
         
-        # 添加模块标签维度
-        module_trends = []
-        modules = WPPostMeta.objects.filter(meta_key='module_tag', meta_value__isnull=False, meta_value__gt='').values_list('meta_value', flat=True).distinct()
+        per_module = defaultdict(list)
+        for row in module_rows:
+            per_module[row['meta_value']].append({'date': row['date'], 'count': row['count']})
         
-        for module in modules:
-            # 获取该模块下的笔记ID
-            post_ids = WPPostMeta.objects.filter(
-                meta_key='module_tag',
-                meta_value=module
-            ).values_list('post_id', flat=True)
-            
-            # 获取该模块下笔记的上传趋势
-            if interval == 'day':
-                module_data = notes.filter(ID__in=post_ids).annotate(date=TruncDate('post_date')).values('date').annotate(count=Count('ID')).order_by('date')
-            elif interval == 'week':
-                module_data = notes.filter(ID__in=post_ids).annotate(date=TruncWeek('post_date')).values('date').annotate(count=Count('ID')).order_by('date')
-            elif interval == 'month':
-                module_data = notes.filter(ID__in=post_ids).annotate(date=TruncMonth('post_date')).values('date').annotate(count=Count('ID')).order_by('date')
-            else:  # year
-                module_data = notes.filter(ID__in=post_ids).annotate(date=TruncYear('post_date')).values('date').annotate(count=Count('ID')).order_by('date')
-            
-            module_trends.append({
-                'module': module,
-                'data': list(module_data)
-            })
+        trends = [{'date': row['date'], 'count': row['count']} for row in overall]
+        module_trends = [
+            {'module': module, 'data': data}
+            for module, data in sorted(per_module.items())
+        ]
         
         return Response({
-            'overall_trend': list(trends),
+            'overall_trend': trends,
             'module_trends': module_trends,
             'interval': interval,
-            'start_date': start_date,
-            'end_date': end_date
+            'start_date': start_date.strftime('%Y-%m-%d'),
+            'end_date': end_date.strftime('%Y-%m-%d')
         })
     except Exception as e:
         logger.error(f"Error in note_upload_trends: {str(e)}")
@@ -789,14 +748,19 @@ def note_upload_trends(request):
         )
 
 @api_view(['GET'])
+@renderer_classes([JSONRenderer, BrowsableAPIRenderer, NDJSONRenderer])
+@cached_analytics('posts', params=('module', 'limit', 'cursor', 'format'))
 def module_notes_content(request):
     """
     API endpoint for module-specific notes with text and images
+
+    Optional `limit`/`cursor` page through large modules; pass the returned
+    `next_cursor` to fetch the following page. With `format=ndjson` every
+    note after `cursor` is streamed as one JSON line.
     """
     try:
         # 获取请求的模块标签
         module = request.query_params.get('module', None)
-        base_wordpress_url = "https://s4565901-balance-project.uqcloud.net"  # WordPress URL
         
         # 如果未指定模块，返回所有可用模块列表
         if not module:
@@ -811,125 +775,40 @@ def module_notes_content(request):
                 'modules': list(modules)
             })
         
-        # 获取指定模块的笔记ID
-        post_ids = WPPostMeta.objects.using('wordpress').filter(
-            meta_key='module_tag',
-            meta_value=module
-        ).values_list('post_id', flat=True)
-        
-        # 获取这些笔记的详细信息
-        notes = []
-        for post_id in post_ids:
-            # 获取笔记基本信息
-            post = WPPost.objects.using('wordpress').filter(ID=post_id, post_type='notes', post_status='publish').first()
-            if not post:
-                continue
-                
-            # 获取笔记的图片引用
-            images = []
-            for i in range(1, 6):  # notes_img_1 to notes_img_5
-                img_meta = WPPostMeta.objects.using('wordpress').filter(
-                    post_id=post_id, 
-                    meta_key=f'notes_img_{i}',
-                    meta_value__isnull=False,
-                    meta_value__gt=''
-                ).first()
-                
-                if img_meta:
-                    # 获取图片ID
-                    image_id = img_meta.meta_value
-                    logger.info(f"Found image for post {post_id}: meta_key={img_meta.meta_key}, meta_value={image_id}")
-                    
-                    # 尝试获取附件信息
-                    attachment = WPPost.objects.using('wordpress').filter(ID=image_id, post_type='attachment').first()
-                    
-                    if attachment:
-                        # 获取guid (这通常包含完整URL)
-                        guid = attachment.guid
-                        logger.info(f"Attachment found: ID={attachment.ID}, guid={guid}")
-                        
-                        # 获取上传日期 (用于构建路径)
-                        upload_date = attachment.post_date
-                        year = upload_date.strftime('%Y')
-                        month = upload_date.strftime('%m')
-                        
-                        # 从 _wp_attached_file 元数据获取文件路径
-                        attachment_meta = WPPostMeta.objects.using('wordpress').filter(
-                            post_id=image_id, 
-                            meta_key='_wp_attached_file'
-                        ).first()
-                        
-                        if attachment_meta:
-                            # 元数据中通常包含相对路径，如 "2025/04/image.jpg"
-                            file_path = attachment_meta.meta_value
-                            logger.info(f"Attachment file path: {file_path}")
-                            
-                            # 构建完整URL
-                            full_url = f"{base_wordpress_url}/wp-content/uploads/{file_path}"
-                            
-                            images.append({
-                                'id': image_id,
-                                'url': full_url,
-                                'file_path': file_path
-                            })
-                        else:
-                            # 如果找不到 _wp_attached_file，则从 guid 中提取路径
-                            if guid and 'wp-content/uploads/' in guid:
-                                images.append({
-                                    'id': image_id,
-                                    'url': guid,
-                                    'file_path': guid.split('wp-content/uploads/')[-1] if 'wp-content/uploads/' in guid else None
-                                })
-                            else:
-                                # 使用基于年月的路径
-                                fallback_url = f"{base_wordpress_url}/wp-content/uploads/{year}/{month}/output-{post_id}-{i}.png"
-                                images.append({
-                                    'id': image_id,
-                                    'url': fallback_url,
-                                    'fallback': True,
-                                    'year': year,
-                                    'month': month
-                                })
-                    else:
-                        # 如果找不到附件记录，使用基于当前笔记日期的路径
-                        note_date = post.post_date
-                        year = note_date.strftime('%Y')
-                        month = note_date.strftime('%m')
-                        
-                        # 使用示例URL路径
-                        example_url = f"{base_wordpress_url}/wp-content/uploads/{year}/{month}/output-{post_id}-{i}.png"
-                        
-                        # 添加多个可能的URL
-                        fallback_urls = [
-                            f"{base_wordpress_url}/wp-content/uploads/{year}/{month}/output-{post_id}-{i}.png",
-                            f"{base_wordpress_url}/wp-content/uploads/{year}/{month}/output-{post_id}-{i}.jpg",
-                            f"{base_wordpress_url}/wp-content/uploads/{year}/{month}/{image_id}.png",
-                            f"{base_wordpress_url}/wp-content/uploads/{year}/{month}/{image_id}.jpg"
-                        ]
-                        
-                        images.append({
-                            'id': image_id,
-                            'url': example_url,  # 主要URL
-                            'urls': fallback_urls,  # 备选URL
-                            'fallback': True,
-                            'year': year,
-                            'month': month
-                        })
+        # 分页参数：limit 为每页笔记数，cursor 为上一页最后一篇笔记的ID
+        try:
+            limit = request.query_params.get('limit')
+            limit = int(limit) if limit else None
+            cursor = request.query_params.get('cursor')
+            cursor = int(cursor) if cursor else None
+        except ValueError:
+            return Response({"error": "limit and cursor must be integers."}, status=400)
+        if limit is not None and not 1 <= limit <= MODULE_NOTES_MAX_LIMIT:
+            return Response(
+                {"error": f"limit must be between 1 and {MODULE_NOTES_MAX_LIMIT}."}, status=400
+            )
+        
+        if request.query_params.get('format') == 'ndjson':
+            # 导出模式：分批读取并逐行输出，内存占用与模块大小无关
+            def stream():
+                try:
+                    for note in iter_module_notes(module, cursor=cursor):
+                        yield ndjson_line(note)
+                except Exception as e:
+                    logger.error(f"Error streaming module_notes_content: {str(e)}", exc_info=True)
             
-            notes.append({
-                'id': post.ID,
-                'title': post.post_title,
-                'content': post.post_content,
-                'date': post.post_date,
-                'author': post.post_author,
-                'images': images
-            })
+            response = StreamingHttpResponse(stream(), content_type=NDJSONRenderer.media_type)
+            response['Content-Disposition'] = f'attachment; filename="{slugify(module) or "module"}-notes.ndjson"'
+            return response
+        
+        notes, next_cursor = load_module_notes(module, limit=limit, cursor=cursor)
         
         # 使用 REST Framework 的 Response 类返回响应
         return Response({
             'module': module,
             'notes_count': len(notes),
-            'notes': notes
+            'notes': notes,
+            'next_cursor': next_cursor
         })
     except Exception as e:
         # 记录详细错误信息
@@ -942,6 +821,45 @@ def module_notes_content(request):
         )
     
 @api_view(['GET'])
+def notes_search(request):
+    """
+    Full-text search over published notes.
+
+    `q` holds the search terms (double-quote a phrase), optional `module`
+    limits the results to one module tag, and `page`/`page_size` paginate.
+    Results are ranked by relevance and carry a highlighted snippet.
+    """
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({"error": "q is required."}, status=400)
+    try:
+        page = int(request.query_params.get('page', 1))
+        page_size = int(request.query_params.get('page_size', 20))
+    except ValueError:
+        return Response({"error": "page and page_size must be integers."}, status=400)
+    if page < 1 or not 1 <= page_size <= 100:
+        return Response({"error": "page must be positive and page_size between 1 and 100."}, status=400)
+
+    try:
+        total, results = search_notes(
+            query, module=request.query_params.get('module'), page=page, page_size=page_size
+        )
+        return Response({
+            'query': query,
+            'total': total,
+            'page': page,
+            'page_size': page_size,
+            'results': results
+        })
+    except Exception as e:
+        logger.error(f"Error in notes_search: {str(e)}", exc_info=True)
+        return Response(
+            {'error': 'Failed to search notes'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+@cached_analytics('posts')
 def notes_statistics(request):
     """
     API endpoint for retrieving notes statistics overview
@@ -1026,79 +944,47 @@ def get_wordpress_users(request):
 def user_favorites(request):
     """
     Retrieve user's favorite content and module distribution based on title mapping.
+
+    Several users can be requested at once with `user_ids=1,2,3` (or repeated
+    `user_id`); the response then lists each user's favorites and the
+    combined module stats.
     """
     try:
-        user_id = request.query_params.get('user_id')
+        try:
+            user_ids = parse_user_ids(request)
+        except ValueError:
+            return Response({'error': 'Invalid user ID format'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not user_id:
+        if not user_ids:
             wp_user = WPUser.objects.using('wordpress').filter(user_email=request.user.email).first()
             if wp_user:
-                user_id = wp_user.ID
+                user_ids = [wp_user.ID]
             else:
                 return Response({'error': 'WordPress user not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        favorites = []
-        module_stats = {}
-
-        # 1. Fetch favorited courses
-        wishlist_entries = WPUserMeta.objects.using('wordpress').filter(
-            user_id=user_id,
-            meta_key='_tutor_course_wishlist'
-        ).values_list('meta_value', flat=True)
-
-        for course_id in wishlist_entries:
-            try:
-                course = WPPost.objects.using('wordpress').filter(
-                    ID=course_id,
-                    post_type='courses'
-                ).values('ID', 'post_title').first()
-
-                if course:
-                    favorites.append({
-                        'id': course['ID'],
-                        'title': course['post_title'],
-                        'type': 'course'
-                    })
-
-                    module = resolve_module_from_title(course['post_title'])
-                    module_stats[module] = module_stats.get(module, 0) + 1
-
-            except Exception as e:
-                logger.warning(f"Error processing course {course_id}: {str(e)}")
-                continue
-
-        # 2. Fetch bookmarked posts
-        bookmarked_posts_entry = WPUserMeta.objects.using('wordpress').filter(
-            user_id=user_id,
-            meta_key='bookmarked_posts'
-        ).values_list('meta_value', flat=True).first()
-
-        if bookmarked_posts_entry:
-            try:
-                post_ids = re.findall(r'i:\d+;i:(\d+);', bookmarked_posts_entry)
-                for post_id in post_ids:
-                    post = WPPost.objects.using('wordpress').filter(
-                        ID=post_id
-                    ).values('ID', 'post_title', 'post_type').first()
-
-                    if post:
-                        favorites.append({
-                            'id': post['ID'],
-                            'title': post['post_title'],
-                            'type': post['post_type']
-                        })
-
-                        module = resolve_module_from_title(post['post_title'])
-                        module_stats[module] = module_stats.get(module, 0) + 1
+        favorites_by_user = load_user_favorites(user_ids)
 
-            except Exception as e:
-                logger.warning(f"Error parsing bookmarked posts: {str(e)}")
+        if len(user_ids) == 1:
+            favorites, module_stats = favorites_by_user[user_ids[0]]
+            return Response({
+                'favorites': favorites,
+                'stats': [{'module': name, 'count': count} for name, count in module_stats.items()]
+            })
 
-        stats = [{'module': name, 'count': count} for name, count in module_stats.items()]
+        total_stats = Counter()
+        users = []
+        for user_id in user_ids:
+            favorites, module_stats = favorites_by_user[user_id]
+            total_stats.update(module_stats)
+            users.append({
+                'user_id': user_id,
+                'favorites': favorites,
+                'stats': [{'module': name, 'count': count} for name, count in module_stats.items()]
+            })
 
         return Response({
-            'favorites': favorites,
-            'stats': stats
+            'users': users,
+            'stats': [{'module': name, 'count': count} for name, count in total_stats.items()]
         })
 
     except Exception as e:
@@ -1109,6 +995,79 @@ def user_favorites(request):
         )
 
 
+def load_user_favorites(user_ids):
+    """
+    Favorited courses and bookmarked posts of the given users, resolved with
+    one usermeta query and one `ID__in` query per kind of favorite.
+
+    Returns `{user_id: (favorites, {module: count})}`.
+    """
+    wishlists = defaultdict(list)
+    bookmarks = {}
+    metas = WPUserMeta.objects.using('wordpress').filter(
+        user_id__in=user_ids,
+        meta_key__in=['_tutor_course_wishlist', 'bookmarked_posts']
+    ).order_by('umeta_id').values_list('umeta_id', 'user_id', 'meta_key', 'meta_value')
+    for umeta_id, user_id, meta_key, meta_value in metas:
+        if meta_key == '_tutor_course_wishlist':
+            if meta_value and meta_value.strip().isdigit():
+                wishlists[user_id].append(int(meta_value))
+        elif user_id not in bookmarks and meta_value:
+            bookmarked = decode_usermeta(umeta_id, meta_value)
+            if isinstance(bookmarked, dict):
+                bookmarks[user_id] = [
+                    post_id for post_id in bookmarked.values() if isinstance(post_id, int)
+                ]
+            else:
+                logger.warning(f"Could not decode bookmarked posts of user {user_id}")
+
+    course_ids = {course_id for ids in wishlists.values() for course_id in ids}
+    courses = {
+        course['ID']: course
+        for course in WPPost.objects.using('wordpress').filter(
+            ID__in=course_ids,
+            post_type='courses'
+        ).values('ID', 'post_title')
+    } if course_ids else {}
+
+    post_ids = {post_id for ids in bookmarks.values() for post_id in ids}
+    posts = {
+        post['ID']: post
+        for post in WPPost.objects.using('wordpress').filter(
+            ID__in=post_ids
+        ).values('ID', 'post_title', 'post_type')
+    } if post_ids else {}
+
+    result = {}
+    for user_id in user_ids:
+        favorites = []
+        module_stats = {}
+        for course_id in wishlists.get(user_id, []):
+            course = courses.get(course_id)
+            if course:
+                favorites.append({
+                    'id': course['ID'],
+                    'title': course['post_title'],
+                    'type': 'course'
+                })
+                module = resolve_module_from_title(course['post_title'])
+                module_stats[module] = module_stats.get(module, 0) + 1
+
+        for post_id in bookmarks.get(user_id, []):
+            post = posts.get(post_id)
+            if post:
+                favorites.append({
+                    'id': post['ID'],
+                    'title': post['post_title'],
+                    'type': post['post_type']
+                })
+                module = resolve_module_from_title(post['post_title'])
+                module_stats[module] = module_stats.get(module, 0) + 1
+
+        result[user_id] = (favorites, module_stats)
+    return result
+
+
 def resolve_module_from_title(title):
     """
     Map specific titles to high-level modules.
@@ -1138,23 +1097,62 @@ def resolve_module_from_title(title):
 
     return mapping.get(title, 'Uncategorized')
 
+def session_heatmap(start_date, end_date, user_ids=None):
+    """
+    Logins per day and hour from the `session_tokens` usermeta of the given
+    users (all users when `user_ids` is None), read in one scan.
+
+    Returns `(dates, counts, users)`: the day strings of the range, a flat
+    `array` of len(dates) * 24 login counts (row-major by day) and the
+    number of users with at least one login in the range.
+    """
+    first_day = start_date.date()
+    days = (end_date.date() - first_day).days + 1
+    dates = [(first_day + timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(days)]
+    counts = array('l', bytes(days * 24 * array('l').itemsize))
+    users = set()
+
+    metas = WPUserMeta.objects.using('wordpress').filter(meta_key='session_tokens')
+    if user_ids is not None:
+        metas = metas.filter(user_id__in=user_ids)
+    for umeta_id, user_id, meta_value in metas.values_list('umeta_id', 'user_id', 'meta_value').iterator():
+        tokens = decode_usermeta(umeta_id, meta_value)
+        if not isinstance(tokens, dict):
+            continue
+        for session in tokens.values():
+            login = session.get('login') if isinstance(session, dict) else None
+            if not isinstance(login, int):
+                continue
+            try:
+                login_time = datetime.fromtimestamp(login)
+            except (ValueError, OverflowError, OSError):
+                logger.debug(f"Invalid login timestamp {login} in usermeta {umeta_id}")
+                continue
+            offset = (login_time.date() - first_day).days
+            if 0 <= offset < days:
+                counts[offset * 24 + login_time.hour] += 1
+                users.add(user_id)
+    return dates, counts, len(users)
+
+
 @api_view(['GET'])
 def session_activity(request):
-    """Get user session activity data for heatmap visualization - bypassing middleware"""
+    """
+    Get user session activity data for heatmap visualization - bypassing middleware
+
+    With `user_ids` (comma separated IDs, or `all`) the logins of the cohort
+    are summed into one heatmap returned as a dense days x 24 matrix.
+    """
     try:
         from urllib.parse import parse_qs
         
-        query_string = request.META.get('QUERY_STRING', '')
-        print(f"Original query string: {query_string}")
-        
-        raw_params = parse_qs(query_string)
+        # 日期参数直接从原始查询串读取，绕过 DateParamMiddleware 的改写
+        raw_params = parse_qs(request.META.get('QUERY_STRING', ''))
         
         user_id = raw_params.get('user_id', [None])[0]
         start_date_str = raw_params.get('start_date', [None])[0]
         end_date_str = raw_params.get('end_date', [None])[0]
         
-        print(f"Raw parameters from query string: user_id={user_id}, start_date={start_date_str}, end_date={end_date_str}")
-        
         if not start_date_str:
             start_date_str = request.GET.get('start_date')
         if not end_date_str:
@@ -1162,36 +1160,57 @@ def session_activity(request):
         if not user_id:
             user_id = request.GET.get('user_id')
         
-        print(f"Final parameters: user_id={user_id}, start_date={start_date_str}, end_date={end_date_str}")
-        
         if not start_date_str:
             start_date = datetime.now() - timedelta(days=30)
-            print("Using default start_date (30 days ago)")
         else:
             try:
                 start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
-                print(f"Parsed start_date: {start_date}")
             except ValueError as e:
-                print(f"Invalid start_date format '{start_date_str}': {e}, using default")
+                logger.warning(f"Invalid start_date format '{start_date_str}': {e}, using default")
                 start_date = datetime.now() - timedelta(days=30)
         
         if not end_date_str:
             end_date = datetime.now()
-            print("Using default end_date (today)")
         else:
             try:
                 end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
                 end_date = end_date.replace(hour=23, minute=59, second=59)
-                print(f"Parsed end_date: {end_date}")
             except ValueError as e:
-                print(f"Invalid end_date format '{end_date_str}': {e}, using default")
+                logger.warning(f"Invalid end_date format '{end_date_str}': {e}, using default")
                 end_date = datetime.now()
         
         if start_date > end_date:
-            print("start_date is after end_date, swapping them")
+            logger.warning("session_activity: start_date is after end_date, swapping them")
             start_date, end_date = end_date - timedelta(days=30), start_date
         
-        print(f"Final date range: {start_date} to {end_date}")
+        # 队列模式：user_ids=1,2,3 或 user_ids=all
+        cohort = request.query_params.get('user_ids')
+        if cohort is not None:
+            if cohort.strip().lower() == 'all':
+                user_ids = None
+            else:
+                try:
+                    user_ids = parse_user_ids(request)
+                except ValueError:
+                    return Response({
+                        'error': 'Invalid user ID format'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                if not user_ids:
+                    return Response({
+                        'error': 'No user IDs given'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+            
+            dates, counts, active_users = session_heatmap(start_date, end_date, user_ids)
+            return Response({
+                'start_date': dates[0],
+                'end_date': dates[-1],
+                'user_ids': 'all' if user_ids is None else user_ids,
+                'active_users': active_users,
+                'total_sessions': sum(counts),
+                'dates': dates,
+                'hours': list(range(24)),
+                'matrix': [counts[row * 24:(row + 1) * 24].tolist() for row in range(len(dates))]
+            })
         
         if not user_id:
             try:
@@ -1200,7 +1219,6 @@ def session_activity(request):
                 ).first()
                 if wp_user:
                     user_id = wp_user.ID
-                    print(f"Found WordPress user ID {user_id} for email {request.user.email}")
                 else:
                     return Response({
                         'error': 'Could not find WordPress user for current user'
@@ -1217,78 +1235,22 @@ def session_activity(request):
                 'error': 'Invalid user ID format'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        print(f"Processing session activity for user {user_id}")
-        
-        activity_data = {}
-        current_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_date_only = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        while current_date <= end_date_only:
-            date_str = current_date.strftime('%Y-%m-%d')
-            activity_data[date_str] = {
-                'date': date_str, 
-                'hours': []
+        dates, counts, _ = session_heatmap(start_date, end_date, [user_id])
+        result = [
+            {
+                'date': date_str,
+                'hours': [
+                    {'hour': hour, 'session_count': counts[row * 24 + hour]}
+                    for hour in range(24)
+                ]
             }
-            
-            for hour in range(24):
-                activity_data[date_str]['hours'].append({
-                    'hour': hour,
-                    'session_count': 0
-                })
-            
-            current_date += timedelta(days=1)
-        
-        print(f"Initialized {len(activity_data)} days of data structure")
-        
-        total_sessions_found = 0
-        try:
-            session_metas = WPUserMeta.objects.using('wordpress').filter(
-                user_id=user_id,
-                meta_key='session_tokens'
-            )
-            
-            print(f"Found {session_metas.count()} session_tokens entries for user {user_id}")
-            
-            for session_meta in session_metas:
-                if session_meta.meta_value:
-                    print(f"Processing session_tokens data (length: {len(session_meta.meta_value)})")
-                    
-                    login_timestamps = re.findall(r's:5:"login";i:(\d+);', session_meta.meta_value)
-                    print(f"Extracted {len(login_timestamps)} login timestamps")
-                    
-                    for timestamp_str in login_timestamps:
-                        try:
-                            timestamp = int(timestamp_str)
-                            login_time = datetime.fromtimestamp(timestamp)
-                            
-                            if start_date.date() <= login_time.date() <= end_date.date():
-                                date_str = login_time.strftime('%Y-%m-%d')
-                                hour = login_time.hour
-                                
-                                if date_str in activity_data:
-                                    activity_data[date_str]['hours'][hour]['session_count'] += 1
-                                    total_sessions_found += 1
-                                    print(f"Added session for {date_str} at hour {hour} (login_time: {login_time})")
-                                    
-                        except (ValueError, TypeError, OSError) as e:
-                            print(f"Invalid timestamp {timestamp_str}: {e}")
-                            continue
-                            
-        except Exception as e:
-            print(f"Error processing session tokens: {str(e)}")
-            import traceback
-            traceback.print_exc()
-        
-        
-        result = list(activity_data.values())
-        
+            for row, date_str in enumerate(dates)
+        ]
         
         return Response(result)
         
     except Exception as e:
-        print(f"Error retrieving session activity data: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"Error retrieving session activity data: {str(e)}", exc_info=True)
         return Response(
             {'error': f'Failed to retrieve session activity data: {str(e)}'}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -1355,16 +1317,27 @@ def user_posts_analysis(request):
         
         logger.info(f"Analyzing posts for user {user_id} from {start_date} to {end_date}")
         
-        # 获取用户帖子
+        # 一次性获取用户帖子；词云可从索引获得时不读取正文
+        use_index = index_available()
+        fields = ['ID', 'post_date', 'post_type']
+        if not use_index:
+            fields.append('post_content')
         try:
-            user_posts = WPPost.objects.using('wordpress').filter(
+            posts = WPPost.objects.using('wordpress').filter(
                 post_author=user_id,
                 post_date__gte=start_date,
                 post_date__lte=end_date,
                 post_status='publish'
             )
+            user_posts = list(posts.values_list(*fields))
+            
+            # 索引只包含笔记；范围内有其他类型的帖子时改为实时统计全部正文
+            if use_index and any(post[2] != 'notes' for post in user_posts):
+                use_index = False
+                contents = dict(posts.values_list('ID', 'post_content'))
+                user_posts = [post + (contents.get(post[0]),) for post in user_posts]
             
-            logger.info(f"Found {user_posts.count()} posts")
+            logger.info(f"Found {len(user_posts)} posts")
             
         except Exception as e:
             logger.error(f"Error querying posts: {e}")
@@ -1373,7 +1346,7 @@ def user_posts_analysis(request):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
         # 如果没有帖子，返回空数据
-        if not user_posts.exists():
+        if not user_posts:
             logger.info("No posts found, returning empty data")
             return Response({
                 'activity': [],
@@ -1381,81 +1354,49 @@ def user_posts_analysis(request):
                 'wordCloud': []
             })
         
-        # 处理文本数据
-        all_text = ""
-        for post in user_posts:
-            if post.post_content:
-                all_text += " " + post.post_content
-        
-        # 清理文本
+        # 一次查询获取所有帖子的模块标签
         try:
-            all_text = re.sub(r'<[^>]*>', ' ', all_text)  # 移除HTML标签
-            all_text = re.sub(r'[^\w\s]', ' ', all_text.lower())  # 移除特殊字符并转为小写
-            
-            # 生成词云数据
-            words = [word for word in all_text.split() if len(word) > 3]
-            word_count = Counter(words).most_common(50)
-            
+            tags = module_tags([post[0] for post in user_posts])
         except Exception as e:
-            logger.error(f"Error processing text: {e}")
-            word_count = []
+            logger.error(f"Error processing module data: {e}")
+            tags = {}
         
-        # 按日期分组活动数据
-        activity_data = []
-        try:
-            date_format = '%Y-%m-%d'
-            if interval == 'week':
-                date_format = '%Y-%W'
-            elif interval == 'month':
-                date_format = '%Y-%m'
-            
-            post_dates = {}
-            for post in user_posts:
-                if post.post_date:
-                    date_key = post.post_date.strftime(date_format)
-                    post_dates[date_key] = post_dates.get(date_key, 0) + 1
-            
-            # 排序并格式化
-            for date_key in sorted(post_dates.keys()):
-                activity_data.append({
-                    'date': date_key,
-                    'count': post_dates[date_key]
-                })
-                
-        except Exception as e:
-            logger.error(f"Error processing activity data: {e}")
-            activity_data = []
+        date_format = '%Y-%m-%d'
+        if interval == 'week':
+            date_format = '%Y-%W'
+        elif interval == 'month':
+            date_format = '%Y-%m'
         
-        # 获取模块分布
-        module_data = []
+        # 单次遍历同时统计活动、模块分布和词频
+        post_dates = Counter()
+        module_count = Counter()
+        words = Counter()
+        for post in user_posts:
+            post_id, post_date = post[0], post[1]
+            if post_date:
+                post_dates[post_date.strftime(date_format)] += 1
+            module_count[tags.get(post_id) or 'Uncategorized'] += 1
+            if not use_index:
+                words.update(tokenize(post[3]))
+        
+        activity_data = [
+            {'date': date_key, 'count': post_dates[date_key]}
+            for date_key in sorted(post_dates)
+        ]
+        module_data = [
+            {'module': module, 'count': count}
+            for module, count in module_count.items()
+        ]
+        
+        # 生成词云数据
         try:
-            module_count = {}
-            
-            for post in user_posts:
-                try:
-                    # 获取模块标签
-                    module_meta = WPPostMeta.objects.using('wordpress').filter(
-                        post_id=post.ID,
-                        meta_key='module_tag'
-                    ).first()
-                    
-                    module = module_meta.meta_value if module_meta and module_meta.meta_value else 'Uncategorized'
-                    module_count[module] = module_count.get(module, 0) + 1
-                    
-                except Exception as e:
-                    logger.warning(f"Error getting module for post {post.ID}: {e}")
-                    module_count['Uncategorized'] = module_count.get('Uncategorized', 0) + 1
-            
-            # 格式化模块数据
-            for module, count in module_count.items():
-                module_data.append({
-                    'module': module,
-                    'count': count
-                })
-                
+            if use_index:
+                word_count = top_terms(50, user_id=user_id, start_date=start_date, end_date=end_date)
+            else:
+                word_count = most_common_terms(words, 50)
         except Exception as e:
-            logger.error(f"Error processing module data: {e}")
-            module_data = []
+            logger.error(f"Error processing text: {e}")
+            word_count = []
         
         # 返回结果
         result = {
@@ -1476,11 +1417,123 @@ def user_posts_analysis(request):
         )
 
 
+MODULE_STATUSES = ('not_started', 'in_progress', 'completed')
+
+
+def course_modules():
+    """
+    Module names of the course catalog: the titles of the published courses,
+    or the distinct `module_tag` values when no course is published.
+    """
+    titles = WPPost.objects.using('wordpress').filter(
+        post_type='courses',
+        post_status='publish'
+    ).values_list('post_title', flat=True)
+    modules = {title.strip() for title in titles if title}
+    if not modules:
+        tag_rows = WPPostMeta.objects.using('wordpress').filter(
+            meta_key='module_tag'
+        ).values_list('meta_value', flat=True).distinct()
+        modules = {tag for tag in tag_rows if tag}
+    return sorted(modules)
+
+
+def module_completion_matrix(modules, user_ids=None):
+    """
+    Status of every module for the given users (every user with a
+    `course_status_*` meta when `user_ids` is None), from one `user_id__in`
+    query on the statuses and one `ID__in` query on the course titles.
+
+    A module is completed when every course of it the user started is
+    completed, in progress when any was started, else not started.
+    Returns `{user_id: [status, ...]}` with statuses in `modules` order.
+    """
+    statuses = WPUserMeta.objects.using('wordpress').filter(meta_key__startswith='course_status_')
+    if user_ids is not None:
+        statuses = statuses.filter(user_id__in=user_ids)
+
+    # {user_id: {course_id: status}}
+    user_courses = defaultdict(dict)
+    for user_id, meta_key, meta_value in statuses.values_list('user_id', 'meta_key', 'meta_value'):
+        course_id = meta_key.replace('course_status_', '')
+        if course_id.isdigit():
+            user_courses[user_id][int(course_id)] = (meta_value or '').strip().lower()
+
+    course_ids = {course_id for courses in user_courses.values() for course_id in courses}
+    course_titles = dict(
+        WPPost.objects.using('wordpress').filter(ID__in=course_ids).values_list('ID', 'post_title')
+    ) if course_ids else {}
+
+    module_index = {module: index for index, module in enumerate(modules)}
+    matrix = {}
+    for user_id in (user_courses if user_ids is None else user_ids):
+        started = [0] * len(modules)
+        completed = [0] * len(modules)
+        for course_id, status_value in user_courses.get(user_id, {}).items():
+            index = module_index.get(course_titles.get(course_id))
+            if index is None:
+                continue
+            started[index] += 1
+            if 'complet' in status_value:  # Handle variations like "Completed!"
+                completed[index] += 1
+        matrix[user_id] = [
+            'not_started' if not started[index]
+            else 'completed' if completed[index] == started[index]
+            else 'in_progress'
+            for index in range(len(modules))
+        ]
+    return matrix
+
+
 @api_view(['GET'])
 def module_completion_status(request):
-    """Dynamically retrieve user module completion status"""
+    """
+    Dynamically retrieve user module completion status
+
+    With `user_ids` (comma separated IDs, or `all`) the statuses of the whole
+    cohort are returned as a user x module matrix.
+    """
     try:
-        # ================== 1. Get User ID ==================
+        # ================== 1. Cohort mode ==================
+        cohort = request.query_params.get('user_ids')
+        if cohort is not None:
+            if cohort.strip().lower() == 'all':
+                user_ids = None
+            else:
+                try:
+                    user_ids = parse_user_ids(request)
+                except ValueError:
+                    return Response(
+                        {'error': 'Invalid user ID format'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                if not user_ids:
+                    return Response(
+                        {'error': 'No user IDs given'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+            modules = course_modules()
+            matrix = module_completion_matrix(modules, user_ids)
+            users = sorted(matrix) if user_ids is None else user_ids
+            return Response({
+                'modules': modules,
+                'statuses': list(MODULE_STATUSES),
+                'users': users,
+                'matrix': [matrix[user_id] for user_id in users],
+                'summary': [
+                    {
+                        'name': module,
+                        **{
+                            status_name: sum(1 for user_id in users if matrix[user_id][index] == status_name)
+                            for status_name in MODULE_STATUSES
+                        }
+                    }
+                    for index, module in enumerate(modules)
+                ]
+            })
+
+        # ================== 2. Get User ID ==================
         user_id = request.query_params.get('user_id')
         
         # If user_id not provided, try to get it from current user
@@ -1504,171 +1557,87 @@ def module_completion_status(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        print(f"\n====== Processing module status for user {user_id} ======")
+        # ================== 3. Calculate Module Status ==================
+        modules = course_modules()
+        statuses = module_completion_matrix(modules, [user_id])[user_id]
 
-        # ================== 2. Get All Modules from the Database ==================
-        # First try to get modules from course titles
-        all_courses = WPPost.objects.using('wordpress').filter(
-            post_type='courses',
-            post_status='publish'
-        ).values('ID', 'post_title')
-        
-        # Extract unique module names from course titles
-        # This assumes the main modules are the course titles themselves
-        all_modules = set()
-        for course in all_courses:
-            title = course['post_title']
-            # Clean and standardize the title
-            cleaned_title = title.strip()
-            all_modules.add(cleaned_title)
-        
-        # If no courses found, use a fallback approach
-        if not all_modules:
-            # Check if module_tag metadata exists
-            module_tags = WPPostMeta.objects.using('wordpress').filter(
-                meta_key='module_tag'
-            ).values_list('meta_value', flat=True).distinct()
-            
-            if module_tags:
-                all_modules = set(tag for tag in module_tags if tag)
-        
-        print(f"Found {len(all_modules)} modules in the database")
-        
-        # ================== 3. Get User's Course Statuses ==================
-        user_statuses = WPUserMeta.objects.using('wordpress').filter(
-            user_id=user_id,
-            meta_key__startswith='course_status_'
-        ).values('meta_key', 'meta_value')
-
-        # Build course status dictionary: {"course_id": "status"}
-        user_courses = {}
-        for record in user_statuses:
-            course_id = record['meta_key'].replace('course_status_', '')
-            status_value = record['meta_value'].strip().lower()
-            user_courses[course_id] = status_value
-
-        # ================== 4. Map Courses to Modules ==================
-        # Get course titles for the user's courses
-        user_course_ids = []
-        for course_id in user_courses.keys():
-            try:
-                user_course_ids.append(int(course_id))
-            except ValueError:
-                continue
-        
-        # Get course details
-        user_course_details = WPPost.objects.using('wordpress').filter(
-            ID__in=user_course_ids
-        ).values('ID', 'post_title')
-        
-        # Map course ID to title
-        course_title_map = {str(c['ID']): c['post_title'] for c in user_course_details}
-        
-        # Map courses to modules based on exact title match
-        module_courses = {module: [] for module in all_modules}
-        
-        # Map each course to its module (assuming course title is the module)
-        for course_id, title in course_title_map.items():
-            if title in module_courses:
-                module_courses[title].append(course_id)
-        
-        # ================== 5. Calculate Module Status ==================
         module_data = []
-        for index, module_name in enumerate(sorted(all_modules), 1):
-            # Get courses for this module
-            course_ids = module_courses.get(module_name, [])
-            
-            # Default status is not_started
-            status = "not_started"
+        for index, (module_name, module_status) in enumerate(zip(modules, statuses), 1):
             time_data = {}
-            
-            # Count completed and started courses
-            total = len(course_ids)
-            started = 0
-            completed = 0
-            
-            # Check each course status
-            for cid in course_ids:
-                if cid in user_courses:
-                    status_value = user_courses[cid]
-                    started += 1
-                    if 'complet' in status_value:  # Handle variations like "Completed!"
-                        completed += 1
-            
-            # Determine module status
-            if started > 0:
+            if module_status != 'not_started':
                 time_data = {
                     'start_time': datetime.now().isoformat(),
-                    'complete_time': datetime.now().isoformat() if completed == total and total > 0 else None
+                    'complete_time': datetime.now().isoformat() if module_status == 'completed' else None
                 }
-                if completed == total and total > 0:
-                    status = "completed"
-                else:
-                    status = "in_progress"
 
             # Add module data (include all modules even if not started)
             module_data.append({
                 'id': index,
                 'name': module_name,
-                'status': status,
+                'status': module_status,
                 **time_data
             })
 
         return Response(module_data)
 
     except Exception as e:
-        import traceback
-        error_msg = f"Server error: {str(e)}\n{traceback.format_exc()}"
-        print(error_msg)
+        logger.error(f"Unable to retrieve module status: {str(e)}", exc_info=True)
         return Response(
             {'error': 'Unable to retrieve module status'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )   
+def course_enrollment_counts(course_ids):
+    """
+    `{course_id: (enrollments, completed, in_progress)}` of the given courses,
+    classified with a CASE on `meta_value` and grouped by the course ID taken
+    from `course_status_<id>` in SQL, so only one row per course is fetched.
+    """
+    if not course_ids:
+        return {}
+    rows = (
+        WPUserMeta.objects.using('wordpress')
+        .filter(meta_key__in=[f'course_status_{course_id}' for course_id in course_ids])
+        .annotate(
+            course_id=Substr('meta_key', len('course_status_') + 1),
+            progress=Case(
+                When(meta_value__icontains='complet', then=Value('completed')),
+                When(meta_value__icontains='progress', then=Value('in_progress')),
+                default=Value('other'),
+                output_field=CharField()
+            )
+        )
+        .values('course_id')
+        .annotate(
+            total=Count('umeta_id'),
+            completed=Count('umeta_id', filter=Q(progress='completed')),
+            in_progress=Count('umeta_id', filter=Q(progress='in_progress'))
+        )
+        .order_by()
+    )
+    return {
+        int(row['course_id']): (row['total'], row['completed'], row['in_progress'])
+        for row in rows
+    }
+
+
 @api_view(['GET'])
+@cached_analytics(('usermeta', 'posts'), stale_while_revalidate=True)
 def course_progress_analysis(request):
     """Analyze course progress for all users"""
     try:
         # 1. Get all available courses
-        all_courses = WPPost.objects.using('wordpress').filter(
+        all_courses = list(WPPost.objects.using('wordpress').filter(
             post_type='courses',
             post_status='publish'
-        ).values('ID', 'post_title', 'post_date', 'post_modified')
-        
-        # 2. Get all course status data from all users
-        all_course_statuses = WPUserMeta.objects.using('wordpress').filter(
-            meta_key__startswith='course_status_'
-        ).values('user_id', 'meta_key', 'meta_value')
-        
-        # Create a map of course IDs to user statuses
-        course_user_statuses = {}
-        for status in all_course_statuses:
-            course_id = status['meta_key'].replace('course_status_', '')
-            if course_id not in course_user_statuses:
-                course_user_statuses[course_id] = []
-                
-            status_value = status['meta_value'].lower()
-            status_category = 'not_started'
-            if 'complet' in status_value:
-                status_category = 'completed'
-            elif 'progress' in status_value:
-                status_category = 'in_progress'
-                
-            course_user_statuses[course_id].append({
-                'user_id': status['user_id'],
-                'status': status_category,
-                'raw_status': status['meta_value']
-            })
+        ).values('ID', 'post_title', 'post_date', 'post_modified'))
+        
+        # 2. Count enrollments per course and status in the database
+        enrollments = course_enrollment_counts([course['ID'] for course in all_courses])
         
         # 3. Process course data with user statistics
         course_data = []
         for course in all_courses:
-            course_id = str(course['ID'])
-            users = course_user_statuses.get(course_id, [])
-            
-            # Calculate course statistics
-            total_users = len(users)
-            completed_users = sum(1 for u in users if u['status'] == 'completed')
-            in_progress_users = sum(1 for u in users if u['status'] == 'in_progress')
+            total_users, completed_users, in_progress_users = enrollments.get(course['ID'], (0, 0, 0))
             
             completion_rate = (completed_users / total_users * 100) if total_users > 0 else 0
             
@@ -2328,39 +2297,32 @@ def system_info(request):
 # Dashboard Page API for Visit Duration Distribution
 
 @api_view(['GET'])
+@cached_analytics('visit')
 def visit_duration_distribution(request):
     """Returns distribution of session durations"""
     try:
-        # Define duration buckets (in seconds)
+        # Duration buckets by lower bound (in seconds)
         buckets = [
-            (0, 10, '0-10s'),
-            (11, 30, '11-30s'),
-            (31, 60, '31-60s'),
-            (61, 180, '1-3min'),
-            (181, 600, '3-10min'),
-            (601, 1800, '10-30min'),
-            (1801, float('inf'), '30min+')
+            (0, '0-10s'),
+            (11, '11-30s'),
+            (31, '31-60s'),
+            (61, '1-3min'),
+            (181, '3-10min'),
+            (601, '10-30min'),
+            (1801, '30min+')
         ]
         
-        # Prepare result array
-        result = []
+        # Count every bucket in a single pass
+        counts = bucketed_histogram(
+            MatomoLogVisit.objects.all(),
+            'visit_total_time',
+            [start for start, _ in buckets]
+        )
         
-        # Calculate for each bucket
-        for start, end, label in buckets:
-            if end == float('inf'):
-                count = MatomoLogVisit.objects.filter(
-                    visit_total_time__gte=start
-                ).count()
-            else:
-                count = MatomoLogVisit.objects.filter(
-                    visit_total_time__gte=start,
-                    visit_total_time__lt=end
-                ).count()
-            
-            result.append({
-                'duration_range': label,
-                'count': count
-            })
+        result = [
+            {'duration_range': label, 'count': count}
+            for (_, label), count in zip(buckets, counts)
+        ]
         
         return Response(result)
         
@@ -2368,206 +2330,161 @@ def visit_duration_distribution(request):
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['GET'])
+@cached_analytics(
+    ('link_visit_action', 'page_transitions', 'action_categories'), params=('start_date', 'end_date')
+)
 def comment_source_analysis(request):
     """Returns navigation paths to comment/note pages"""
+    try:
+        start_date, end_date = parse_date_range(request)
+    except ValueError:
+        return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
+
     try:
         # 1. 找出所有与评论/笔记相关的页面 action ID
-        comment_actions = MatomoLogAction.objects.filter(
-            Q(name__icontains='note') | 
-            Q(name__icontains='comment') | 
-            Q(name__icontains='forum')
-        ).values_list('idaction', flat=True)
-
-        # 2. 获取涉及这些页面访问的 visit IDs
-        comment_page_visits = MatomoLogLinkVisitAction.objects.filter(
-            idaction_url__in=comment_actions
-        ).values_list('idvisit', flat=True).distinct()
-
-        paths = []
-
-        for visit_id in comment_page_visits:
-            visit_actions = MatomoLogLinkVisitAction.objects.filter(
-                idvisit=visit_id
-            ).order_by('server_time')
-
-            for i in range(len(visit_actions) - 1):
-                if visit_actions[i + 1].idaction_url in comment_actions:
-                    try:
-                        source = MatomoLogAction.objects.get(idaction=visit_actions[i].idaction_url)
-                        target = MatomoLogAction.objects.get(idaction=visit_actions[i + 1].idaction_url)
-
-                        # 提取纯路径部分
-                        source_path = clean_path(source.name)
-                        target_path = clean_path(target.name)
-
-                        paths.append({
-                            'source': source_path,
-                            'target': target_path,
-                            'count': 1
-                        })
-                    except MatomoLogAction.DoesNotExist:
-                        continue
-
-        # 聚合相同路径
-        aggregated_paths = {}
-        for path in paths:
-            key = f"{path['source']}|{path['target']}"
-            if key in aggregated_paths:
-                aggregated_paths[key]['count'] += 1
-            else:
-                aggregated_paths[key] = path
+        comment_actions = category_action_ids(NOTE | COMMENT | FORUM)
+
+        # 2. 从页面跳转矩阵读取进入这些页面的跳转次数
+        counts = transition_counts(
+            'url',
+            target_ids=comment_actions,
+            start_date=start_date,
+            end_date=end_date
+        )
 
-        return Response(list(aggregated_paths.values()))
+        # 3. 提取纯路径部分并聚合相同路径
+        return Response(aggregate_transitions(counts, clean=True))
 
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-def clean_path(url):
+def parse_date_range(request):
+    """
+    Read the optional `start_date`/`end_date` query parameters (YYYY-MM-DD)
+    as dates. Raises ValueError on a malformed date.
     """
-    去除域名，仅保留路径部分
+    start_date_str = request.query_params.get('start_date')
+    end_date_str = request.query_params.get('end_date')
+    start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date() if start_date_str else None
+    end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date() if end_date_str else None
+    return start_date, end_date
+
+def parse_user_ids(request):
     """
-    if not url:
-        return url
-    if url.startswith("http"):
-        return urlparse(url).path or '/'
-    if '/' in url:
-        return '/' + url.split('/', 1)[1]
-    return url
+    Read the user IDs of a cohort request from `user_ids` (comma separated)
+    and/or `user_id` (repeatable or comma separated), keeping their order.
+    Raises ValueError on a non-numeric ID.
+    """
+    user_ids = []
+    for name in ('user_ids', 'user_id'):
+        for value in request.query_params.getlist(name):
+            for part in value.split(','):
+                part = part.strip()
+                if part and int(part) not in user_ids:
+                    user_ids.append(int(part))
+    return user_ids
+
+def parse_timezone(request):
+    """
+    Read the optional `tz` query parameter as a ZoneInfo, or None when it is
+    not given. Raises ZoneInfoNotFoundError on an unknown zone.
+    """
+    tz_name = request.query_params.get('tz')
+    if not tz_name:
+        return None
+    try:
+        return ZoneInfo(tz_name)
+    except ValueError:
+        raise ZoneInfoNotFoundError(tz_name)
+
 @api_view(['GET'])
+@cached_analytics(
+    ('link_visit_action', 'page_transitions', 'action_categories'), params=('start_date', 'end_date')
+)
 def course_source_analysis(request):
     """Returns navigation paths to course-related pages"""
     try:
-        # 1. Find course-related pages by keywords
-        course_actions = MatomoLogAction.objects.filter(
-            Q(name__icontains='/course')
-        ).values_list('idaction', flat=True)
-
-        # 2. Get visit sessions where these actions occurred
-        visit_ids = MatomoLogLinkVisitAction.objects.filter(
-            idaction_url__in=course_actions
-        ).values_list('idvisit', flat=True).distinct()
-
-        # 3. Extract transitions between pages
-        paths = []
-        for visit_id in visit_ids:
-            actions = MatomoLogLinkVisitAction.objects.filter(
-                idvisit=visit_id
-            ).order_by('server_time')
-
-            for i in range(len(actions) - 1):
-                if actions[i + 1].idaction_url in course_actions:
-                    try:
-                        source = MatomoLogAction.objects.get(idaction=actions[i].idaction_url)
-                        target = MatomoLogAction.objects.get(idaction=actions[i + 1].idaction_url)
-
-                        paths.append({
-                            'source': clean_path(source.name),
-                            'target': clean_path(target.name),
-                            'count': 1
-                        })
-                    except MatomoLogAction.DoesNotExist:
-                        continue
-
-        # 4. Aggregate transitions
-        aggregated = {}
-        for path in paths:
-            key = f"{path['source']}|{path['target']}"
-            if key in aggregated:
-                aggregated[key]['count'] += 1
-            else:
-                aggregated[key] = path
+        start_date, end_date = parse_date_range(request)
+    except ValueError:
+        return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
 
-        return Response(list(aggregated.values()))
+    try:
+        # 1. Find course-related pages from the action category index
+        course_actions = category_action_ids(COURSE_PATH)
+
+        # 2. Read transitions into these pages from the transition matrix
+        counts = transition_counts(
+            'url',
+            target_ids=course_actions,
+            start_date=start_date,
+            end_date=end_date
+        )
+
+        # 3. Aggregate transitions by cleaned path
+        return Response(aggregate_transitions(counts, clean=True))
 
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 # User Comment Page API for Comment Time Distribution
 @api_view(['GET'])
+@cached_analytics(('link_visit_action', 'action_categories'), params=('start_date', 'end_date', 'tz'))
 def comment_time_distribution(request):
     """Returns heatmap data showing comment activity by day and hour"""
     try:
-        # Find comment-related actions
-        comment_actions = MatomoLogAction.objects.filter(
-            Q(name__icontains='note') | 
-            Q(name__icontains='comment') | 
-            Q(name__icontains='forum')
-        ).values_list('idaction', flat=True)
-        
-        # Get comment actions with time info
-        comment_actions_data = MatomoLogLinkVisitAction.objects.filter(
-            idaction_url__in=comment_actions
+        start_date, end_date = parse_date_range(request)
+    except ValueError:
+        return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
+    try:
+        tzinfo = parse_timezone(request)
+    except ZoneInfoNotFoundError:
+        return Response({"error": "Invalid tz. Use an IANA time zone name such as 'Australia/Brisbane'."}, status=400)
+
+    try:
+        # Aggregate comment-related actions by weekday and hour, one query per chunk of action IDs
+        heatmap_data = combined_weekly_heatmap(
+            (
+                MatomoLogLinkVisitAction.objects.filter(idaction_url__in=chunk)
+                for chunk in category_action_id_chunks(NOTE | COMMENT | FORUM)
+            ),
+            start_date=start_date,
+            end_date=end_date,
+            tzinfo=tzinfo
         )
         
-        # Initialize heatmap data (7 days × 24 hours)
-        heatmap_data = []
-        for day in range(7):  # 0=Sunday, 6=Saturday
-            for hour in range(24):
-                heatmap_data.append({
-                    'day': day,
-                    'hour': hour,
-                    'count': 0
-                })
-        
-        # Populate heatmap data
-        for action in comment_actions_data:
-            # Extract day and hour from server_time
-            server_time = action.server_time
-            # 0 = Monday in Python's weekday() function, so we convert to make Sunday=0
-            day = (server_time.weekday() + 1) % 7
-            hour = server_time.hour
-            
-            # Find and update the corresponding cell
-            for cell in heatmap_data:
-                if cell['day'] == day and cell['hour'] == hour:
-                    cell['count'] += 1
-                    break
-        
         return Response(heatmap_data)
         
+    except TimeZoneConversionError as e:
+        return Response({'error': f"{e}. Use another tz or omit it."}, status=400)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 # User Engagement Page API for Visit Depth Analysis
 @api_view(['GET'])
+@cached_analytics('visit')
 def visit_depth_analysis(request):
     """Returns distribution of pages viewed per session"""
     try:
-        # Define page view count buckets
+        # Page view count buckets by lower bound
         buckets = [
-            (1, 1, '1 page'),
-            (2, 2, '2 pages'),
-            (3, 5, '3-5 pages'),
-            (6, 10, '6-10 pages'),
-            (11, 20, '11-20 pages'),
-            (21, float('inf'), '21+ pages')
+            (1, '1 page'),
+            (2, '2 pages'),
+            (3, '3-5 pages'),
+            (6, '6-10 pages'),
+            (11, '11-20 pages'),
+            (21, '21+ pages')
         ]
         
-        # Prepare result array
-        result = []
-        
-        # Calculate for each bucket
-        for start, end, label in buckets:
-            if end == float('inf'):
-                count = MatomoLogVisit.objects.filter(
-                    visit_total_actions__gte=start
-                ).count()
-            else:
-                count = MatomoLogVisit.objects.filter(
-                    visit_total_actions__gte=start,
-                    visit_total_actions__lte=end
-                ).count()
-            
-            result.append({
-                'depth_range': label,
-                'count': count,
-                'start': start  # For sorting
-            })
+        # Count every bucket in a single pass
+        counts = bucketed_histogram(
+            MatomoLogVisit.objects.all(),
+            'visit_total_actions',
+            [start for start, _ in buckets]
+        )
         
-        # Sort result by start value
-        result = sorted(result, key=lambda x: x['start'])
-        # Remove start from the output
-        for item in result:
-            del item['start']
+        result = [
+            {'depth_range': label, 'count': count}
+            for (_, label), count in zip(buckets, counts)
+        ]
             
         return Response(result)
         
@@ -2576,58 +2493,24 @@ def visit_depth_analysis(request):
 
 # User Engagement Page API for User Navigation Paths
 @api_view(['GET'])
+@cached_analytics(('link_visit_action', 'page_transitions'), params=('limit', 'start_date', 'end_date'))
 def user_navigation_paths(request):
     """Returns common page-to-page navigation flows"""
+    try:
+        start_date, end_date = parse_date_range(request)
+    except ValueError:
+        return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
+
     try:
         # Get limit parameter
         limit = int(request.query_params.get('limit', 10))
         
-        # Get all visit actions ordered by visit and time
-        paths = []
-        current_visit = None
-        previous_action = None
-        
-        # Get all visits
-        visits = MatomoLogVisit.objects.all().values_list('idvisit', flat=True)
-        
-        for visit_id in visits:
-            # Get actions for this visit in chronological order
-            actions = MatomoLogLinkVisitAction.objects.filter(
-                idvisit=visit_id,
-                idaction_name__isnull=False  # Must have a page name
-            ).order_by('server_time')
-            
-            # Reset previous action for new visit
-            previous_action = None
-            
-            # Analyze page transitions
-            for action in actions:
-                if previous_action is not None:
-                    try:
-                        source = MatomoLogAction.objects.get(idaction=previous_action.idaction_name)
-                        target = MatomoLogAction.objects.get(idaction=action.idaction_name)
-                        
-                        paths.append({
-                            'source': source.name,
-                            'target': target.name,
-                            'count': 1  # For aggregation
-                        })
-                    except MatomoLogAction.DoesNotExist:
-                        pass
-                
-                previous_action = action
-        
-        # Aggregate paths
-        aggregated_paths = {}
-        for path in paths:
-            key = f"{path['source']}|{path['target']}"
-            if key in aggregated_paths:
-                aggregated_paths[key]['count'] += 1
-            else:
-                aggregated_paths[key] = path
+        # Read page name transitions from the transition matrix
+        counts = transition_counts('name', start_date=start_date, end_date=end_date)
+        aggregated_paths = aggregate_transitions(counts)
         
         # Sort by count and return top paths
-        top_paths = sorted(aggregated_paths.values(), key=lambda x: x['count'], reverse=True)[:limit]
+        top_paths = sorted(aggregated_paths, key=lambda x: x['count'], reverse=True)[:limit]
         
         return Response(top_paths)
         
@@ -2636,6 +2519,7 @@ def user_navigation_paths(request):
 
 # Course Progress Page API for Course Completion vs Visit Frequency
 @api_view(['GET'])
+@cached_analytics('visit')
 def course_completion_vs_frequency(request):
     """Returns data correlating visit frequency with course completion"""
     try:
@@ -2669,51 +2553,39 @@ def course_completion_vs_frequency(request):
 
 # Course Progress Page API for Learning Time Distribution
 @api_view(['GET'])
+@cached_analytics(('link_visit_action', 'action_categories'), params=('start_date', 'end_date', 'tz'))
 def learning_time_distribution(request):
     """Returns heatmap showing when users engage with course materials"""
     try:
-        # Find course-related actions
-        course_actions = MatomoLogAction.objects.filter(
-            Q(name__icontains='course') | 
-            Q(name__icontains='lesson') | 
-            Q(name__icontains='module')
-        ).values_list('idaction', flat=True)
-        
-        # Get course-related actions with time info
-        course_actions_data = MatomoLogLinkVisitAction.objects.filter(
-            idaction_url__in=course_actions
+        start_date, end_date = parse_date_range(request)
+    except ValueError:
+        return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
+    try:
+        tzinfo = parse_timezone(request)
+    except ZoneInfoNotFoundError:
+        return Response({"error": "Invalid tz. Use an IANA time zone name such as 'Australia/Brisbane'."}, status=400)
+
+    try:
+        # Aggregate course-related actions by weekday and hour, one query per chunk of action IDs
+        heatmap_data = combined_weekly_heatmap(
+            (
+                MatomoLogLinkVisitAction.objects.filter(idaction_url__in=chunk)
+                for chunk in category_action_id_chunks(COURSE | LESSON | MODULE)
+            ),
+            start_date=start_date,
+            end_date=end_date,
+            tzinfo=tzinfo
         )
         
-        # Initialize heatmap data (7 days × 24 hours)
-        heatmap_data = []
-        for day in range(7):  # 0=Sunday, 6=Saturday
-            for hour in range(24):
-                heatmap_data.append({
-                    'day': day,
-                    'hour': hour,
-                    'count': 0
-                })
-        
-        # Populate heatmap data
-        for action in course_actions_data:
-            # Extract day and hour from server_time
-            server_time = action.server_time
-            # 0 = Monday in Python's weekday() function, so we convert to make Sunday=0
-            day = (server_time.weekday() + 1) % 7
-            hour = server_time.hour
-            
-            # Find and update the corresponding cell
-            for cell in heatmap_data:
-                if cell['day'] == day and cell['hour'] == hour:
-                    cell['count'] += 1
-                    break
-        
         return Response(heatmap_data)
         
+    except TimeZoneConversionError as e:
+        return Response({'error': f"{e}. Use another tz or omit it."}, status=400)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
 @api_view(['GET'])
+@cached_analytics('link_visit_action', params=('metric', 'limit'), stale_while_revalidate=True)
 def popular_content(request):
     """获取最受欢迎的内容页面，基于访问量或停留时间"""
     metric = request.GET.get('metric', 'views')
@@ -2744,10 +2616,7 @@ def popular_content(request):
             
             # 查询页面名称
             action_ids = [item['idaction_name'] for item in results if item['idaction_name']]
-            actions = {
-                action.idaction: action.name 
-                for action in MatomoLogAction.objects.filter(idaction__in=action_ids)
-            }
+            actions = action_dictionary.names(action_ids)
             
             # 格式化结果
             data = []
@@ -2772,10 +2641,7 @@ def popular_content(request):
             
             # 查询页面名称
             action_ids = [item['idaction_name'] for item in results if item['idaction_name']]
-            actions = {
-                action.idaction: action.name 
-                for action in MatomoLogAction.objects.filter(idaction__in=action_ids)
-            }
+            actions = action_dictionary.names(action_ids)
             
             # 格式化结果
             data = []
@@ -2801,6 +2667,7 @@ def popular_content(request):
 
 
 @api_view(['GET'])
+@cached_analytics(('visit', 'visit_rollup'), params=('interval', 'start_date', 'end_date'))
 def visit_trends(request):
     """获取访问趋势数据，支持按日/周/月聚合"""
     interval = request.GET.get('interval', 'day')
@@ -2815,41 +2682,43 @@ def visit_trends(request):
         return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
     
     try:
-        # 根据间隔选择不同的日期截断函数
-        if interval == 'day':
-            date_trunc = TruncDate('visit_first_action_time')
-        elif interval == 'week':
-            date_trunc = TruncWeek('visit_first_action_time')
-        elif interval == 'month':
-            date_trunc = TruncMonth('visit_first_action_time')
-        else:
+        if interval not in ('day', 'week', 'month'):
             return Response({"error": "Invalid interval. Use day, week, or month."}, status=400)
-        
-        # 获取访问数据，按日/周/月分组
-        visit_data = (
-            MatomoLogVisit.objects
-            .filter(
-                visit_first_action_time__date__gte=start_date,
-                visit_first_action_time__date__lte=end_date
-            )
-            .annotate(date=date_trunc)
-            .values('date')
-            .annotate(
-                visits=Count('idvisit'),
-                uniqueVisitors=Count('idvisitor', distinct=True)
-            )
-            .order_by('date')
-        )
-        
-        # 将结果转换为字典以便快速查找
+
         data_dict = {}
-        for item in visit_data:
-            date_key = item['date'].strftime('%Y-%m-%d')
-            data_dict[date_key] = {
-                'visits': item['visits'],
-                'uniqueVisitors': item['uniqueVisitors']
-            }
-        
+        if rollup_available():
+            # 历史日期读日汇总表，只有今天实时计算
+            totals = visit_totals(start_date, end_date, interval)
+            for period, item in totals.items():
+                data_dict[period.strftime('%Y-%m-%d')] = item
+        else:
+            # 汇总表尚未生成时直接扫描原始访问表
+            date_trunc = {
+                'day': TruncDate,
+                'week': TruncWeek,
+                'month': TruncMonth,
+            }[interval]('visit_first_action_time')
+            visit_data = (
+                MatomoLogVisit.objects
+                .filter(
+                    visit_first_action_time__date__gte=start_date,
+                    visit_first_action_time__date__lte=end_date
+                )
+                .annotate(date=date_trunc)
+                .values('date')
+                .annotate(
+                    visits=Count('idvisit'),
+                    uniqueVisitors=Count('idvisitor', distinct=True)
+                )
+                .order_by('date')
+            )
+            for item in visit_data:
+                date_key = item['date'].strftime('%Y-%m-%d')
+                data_dict[date_key] = {
+                    'visits': item['visits'],
+                    'uniqueVisitors': item['uniqueVisitors']
+                }
+
         # 生成日期序列，确保包含所有日期，即使没有数据
         result = []
         current = start_date
@@ -2895,7 +2764,60 @@ def visit_trends(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
     
+@api_view(['POST'])
+def analytics_bundle(request):
+    """
+    一次请求计算多个分析组件，各组件在线程池中并发执行。
+
+    请求体:
+        {"widgets": [
+            {"name": "analytics/visit-trends", "params": {"interval": "week"}, "id": "trends"},
+            {"name": "active-users"}
+        ]}
+
+    返回 {"widgets": {id: {"status", "data", "elapsed_ms"}}, "elapsed_ms": 总耗时}，
+    id 缺省时使用 name。
+    """
+    widgets = request.data.get('widgets') if isinstance(request.data, dict) else None
+    if not isinstance(widgets, list) or not widgets:
+        return Response({"error": "widgets must be a non-empty list."}, status=400)
+    if len(widgets) > ANALYTICS_BUNDLE_MAX_WIDGETS:
+        return Response(
+            {"error": f"At most {ANALYTICS_BUNDLE_MAX_WIDGETS} widgets per bundle."}, status=400
+        )
+
+    resolved = []
+    keys = set()
+    for widget in widgets:
+        if not isinstance(widget, dict) or not isinstance(widget.get('name'), str):
+            return Response({"error": "Each widget needs a name."}, status=400)
+        view_name = resolve_widget(widget['name'])
+        if view_name is None:
+            return Response({"error": f"Unknown widget: {widget['name']}"}, status=400)
+
+        params = widget.get('params') or {}
+        if not isinstance(params, dict):
+            return Response({"error": f"params of {widget['name']} must be an object."}, status=400)
+        params = {
+            name: [str(item) for item in value] if isinstance(value, list) else str(value)
+            for name, value in params.items()
+        }
+
+        key = str(widget.get('id') or widget['name'])
+        if key in keys:
+            return Response({"error": f"Duplicate widget id: {key}"}, status=400)
+        keys.add(key)
+        resolved.append((key, view_name, params))
+
+    started = time.monotonic()
+    results = compute_bundle(resolved, user=request.user)
+    return Response({
+        'widgets': results,
+        'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+    })
+
 @api_view(['GET'])
+@cached_analytics(('link_visit_action', 'action_categories'), params=('user_id',))
 def user_content_interaction(request):
     """
     API endpoint to analyze how users interact with different content types
@@ -2970,14 +2892,8 @@ def user_content_interaction(request):
             if action.idaction_name:
                 action_ids.add(action.idaction_name)
         
-        # Get action details from Matomo log action table
-        action_details = {}
-        if action_ids:
-            for action in MatomoLogAction.objects.using('wordpress').filter(idaction__in=action_ids):
-                action_details[action.idaction] = {
-                    'name': action.name,
-                    'type': action.type
-                }
+        # Get category bitmasks from the action category index
+        action_masks = category_masks(action_ids)
         
         # Define interaction types to track
         interaction_types = {
@@ -2996,30 +2912,13 @@ def user_content_interaction(request):
             action_id = action.idaction_url or action.idaction_name
             if not action_id:
                 continue
-                
-            action_info = action_details.get(action_id, {})
-            name = action_info.get('name', '')
             
-            if not name:
+            if action_id not in action_masks:
                 interaction_types['other'] += 1
                 continue
             
-            # Categorize based on URL/name patterns
-            name_lower = str(name).lower()
-            if 'course' in name_lower or '/courses/' in name_lower:
-                interaction_types['course_view'] += 1
-            elif 'note' in name_lower or '/notes/' in name_lower:
-                interaction_types['note_view'] += 1  
-            elif 'comment' in name_lower or '/comment' in name_lower:
-                interaction_types['comment_view'] += 1
-            elif 'bookmark' in name_lower:
-                interaction_types['bookmark_view'] += 1
-            elif 'setting' in name_lower:
-                interaction_types['setting_view'] += 1
-            elif 'page' in name_lower:
-                interaction_types['page_view'] += 1
-            else:
-                interaction_types['content_view'] += 1
+            # Categorize based on the action's category bitmask
+            interaction_types[interaction_type(action_masks[action_id])] += 1
         
         # Convert to list format for response
         interaction_data = [
@@ -3043,31 +2942,11 @@ def user_content_interaction(request):
             date_str = action.server_time.strftime('%Y-%m-%d')
             
             action_id = action.idaction_url or action.idaction_name
-            if not action_id:
-                continue
-                
-            action_info = action_details.get(action_id, {})
-            name = action_info.get('name', '')
-            
-            if not name:
+            if not action_id or action_id not in action_masks:
                 continue
                 
             # Categorize based on content type
-            name_lower = str(name).lower()
-            if 'course' in name_lower or '/courses/' in name_lower:
-                date_counts[date_str]['course_view'] += 1
-            elif 'note' in name_lower or '/notes/' in name_lower:
-                date_counts[date_str]['note_view'] += 1  
-            elif 'comment' in name_lower or '/comment' in name_lower:
-                date_counts[date_str]['comment_view'] += 1
-            elif 'bookmark' in name_lower:
-                date_counts[date_str]['bookmark_view'] += 1
-            elif 'setting' in name_lower:
-                date_counts[date_str]['setting_view'] += 1
-            elif 'page' in name_lower:
-                date_counts[date_str]['page_view'] += 1
-            else:
-                date_counts[date_str]['content_view'] += 1
+            date_counts[date_str][interaction_type(action_masks[action_id])] += 1
         
         # Convert to time series data format
         for date_str, counts in sorted(date_counts.items()):